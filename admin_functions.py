@@ -1,68 +1,194 @@
 # admin_functions.py
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import requests
 import pandas as pd
+import pyarrow as pa
 from io import BytesIO
-import boto3
-from PIL import Image
+from datetime import timedelta
+import time
+import json
+from collections import deque
+from functools import wraps
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import os
 import base64
 import auth  # Import auth.py to refresh tokens
-
-# --- Initialize S3 client ---
-S3_CLIENT = boto3.client(
+import aws_clients  # Shared boto3 clients, created on first use
+import settings  # st.secrets with environment overrides
+import storage  # S3, local-directory and in-memory table storage backends
+import table_store  # Process-wide shared table snapshots
+import s3_parquet  # Column-projected, ranged parquet reads
+import transactions_store  # Partitioned, append-only transactions layout
+import balances  # Incremental per-COI token balance index
+import coi_repository  # Indexed, shared view of the COI table
+import api_client  # Pooled, retrying HTTP client for API Gateway
+import bulk_ops  # Validation and concurrent submission for bulk operations
+import compact_frames  # Arrow-backed, downcast in-memory tables
+import tracing  # Per-rerun spans and counters for the hot paths
+
+# --- Storage constants ---
+BUCKET_NAME = settings.get("s3", "BUCKET_NAME")
+COI_TABLE_NAME = settings.get("s3", "COI_TABLE_NAME")
+TRANSACTIONS_TABLE_NAME = settings.get("s3", "TRANSACTIONS_TABLE_NAME")
+DEFAULT_TOKEN_PRICES_DF_NAME = settings.get("s3", "DEFAULT_TOKEN_PRICES_DF_NAME")
+DEFAULT_BANKS_DF_NAME = settings.get("s3", "DEFAULT_BANKS_DF_NAME")
+
+# Seconds a shared table snapshot is trusted before its ETag is re-checked
+TABLE_TTL_SECONDS = settings.get("s3", "TABLE_TTL_SECONDS", 60)
+
+# Seconds between background checks of the stored tables for new versions (0 disables the watcher)
+WATCH_INTERVAL_SECONDS = settings.get("s3", "WATCH_INTERVAL_SECONDS", 15)
+
+# Longest wait for a backend Lambda to write a table after a mutation before moving on
+WRITE_WAIT_SECONDS = settings.get("s3", "WRITE_WAIT_SECONDS", 10)
+
+# Where the tables live: "s3" (BUCKET_NAME), "local" (a directory, e.g. a synced mirror) or "memory"
+STORAGE_BACKEND = settings.get("storage", "BACKEND", "s3")
+LOCAL_STORAGE_ROOT = settings.get("storage", "LOCAL_ROOT")
+
+# The S3 client is only created when the storage first talks to S3 (see aws_clients)
+S3_CLIENT = aws_clients.lazy(
     's3',
-    aws_access_key_id=st.secrets["s3"]["S3_ACCESS_KEY"],
-    aws_secret_access_key=st.secrets["s3"]["S3_SECRET_KEY"]
+    aws_access_key_id=settings.get("s3", "S3_ACCESS_KEY"),
+    aws_secret_access_key=settings.get("s3", "S3_SECRET_KEY"),
+    endpoint_url=settings.get("s3", "ENDPOINT_URL")  # e.g. a local S3 stand-in
 )
 
-# --- S3 constants ---
-BUCKET_NAME = st.secrets["s3"]["BUCKET_NAME"]
-COI_TABLE_NAME = st.secrets["s3"]["COI_TABLE_NAME"]
-TRANSACTIONS_TABLE_NAME = st.secrets["s3"]["TRANSACTIONS_TABLE_NAME"]
-DEFAULT_TOKEN_PRICES_DF_NAME = st.secrets["s3"]["DEFAULT_TOKEN_PRICES_DF_NAME"]
-DEFAULT_BANKS_DF_NAME = st.secrets["s3"]["DEFAULT_BANKS_DF_NAME"]
+STORAGE = storage.create(STORAGE_BACKEND, client=S3_CLIENT, bucket=BUCKET_NAME, root=LOCAL_STORAGE_ROOT)
+
+# Decode tables to arrow-backed strings, categories and downcast numbers (see compact_frames)
+COMPACT_DTYPES = settings.get("s3", "COMPACT_DTYPES", True)
+
+# --- Tracing (see tracing.py) ---
+TRACE_PANEL = settings.get("tracing", "SHOW_PANEL", False)  # Per-rerun timing panel in the sidebar
+TRACE_LOG = settings.get("tracing", "LOG", False)  # One JSON log line per span on stderr
+TRACE_HISTORY = settings.get("tracing", "HISTORY", 20)  # Reruns kept per session for the panel
+
+if TRACE_LOG:
+    tracing.enable_logging()
+
+# --- Logo: the page shows it 40px wide; the PNG is the JPEG scaled to LOGO_SIZE ---
+LOGO_JPEG = "assets/eureka_logo.jpeg"
+LOGO_PNG = "assets/eureka_logo.png"
+LOGO_SIZE = (80, 80)
+
+# How saved COI edits reach the change-coi-data Lambda:
+#   "row"   - the whole edited table goes to COI_TEMP_TABLE_NAME and each changed row is
+#             posted as a flat dict of COI_CHANGE_COLUMNS (the contract the Lambda has today)
+#   "batch" - only the changed rows go to COI_DELTA_TABLE_NAME and all of them are posted in
+#             one {"rows": [...]} call. Needs the Lambda to read the delta key and to apply
+#             every entry of "rows"; switch only once that version is deployed
+COI_CHANGES_FORMAT = settings.get("api", "COI_CHANGES_FORMAT", "row")
+COI_TEMP_TABLE_NAME = "temp/temp_coi_table.parquet"
+COI_DELTA_TABLE_NAME = "temp/coi_table_delta.parquet"
+COI_CHANGE_COLUMNS = ['uid', 'email', 'first_name', 'last_name', 'access_on']
+
+# Column used by the transactions date filter (falls back to the first date/timestamp column)
+TRANSACTIONS_DATE_COLUMN = settings.get("s3", "TRANSACTIONS_DATE_COLUMN", "timestamp")
+
+# Partitioned transactions layout: used instead of TRANSACTIONS_TABLE_NAME when a prefix is set
+TRANSACTIONS_PREFIX = settings.get("s3", "TRANSACTIONS_PREFIX")
+
+# --- API Gateway endpoints (overridable, e.g. for a local stand-in) ---
+ADD_COI_URL = settings.get("api", "ADD_COI_URL", "https://xuyzj7f0zd.execute-api.us-east-1.amazonaws.com/prod/add-coi")
+DELETE_COI_URL = settings.get("api", "DELETE_COI_URL", "https://7893kaawd5.execute-api.us-east-1.amazonaws.com/prod/delete-coi")
+ADJUST_TOKENS_URL = settings.get("api", "ADJUST_TOKENS_URL", "https://kbeopzaocc.execute-api.us-east-1.amazonaws.com/prod/adjust-tokens")
+CHANGE_COI_DATA_URL = settings.get("api", "CHANGE_COI_DATA_URL", "https://xuyzj7f0zd.execute-api.us-east-1.amazonaws.com/prod/change-coi-data")
+
+# --- API client settings (optional [api] secrets section) ---
+# Concurrent API calls per bulk operation
+BULK_MAX_WORKERS = settings.get("api", "BULK_MAX_WORKERS", bulk_ops.MAX_WORKERS)
+
+# Emails per delete-coi request
+DELETE_CHUNK_SIZE = settings.get("api", "DELETE_CHUNK_SIZE", 25)
 
 # ==============================
 #  HELPER FUNCTIONS
 # ==============================
 
-def safe_api_post(url, data):
+@st.cache_resource
+def get_api_client():
     """
-    Automatically refresh tokens if needed before sending an authorized POST request.
+    Returns the process-wide API client, so every call reuses pooled keep-alive connections.
     """
-    auth.refresh_tokens_if_needed()
+    return api_client.ApiClient(
+        connect_timeout=settings.get("api", "CONNECT_TIMEOUT", 3.05),
+        read_timeout=settings.get("api", "READ_TIMEOUT", 30),
+        max_retries=settings.get("api", "MAX_RETRIES", 3),
+        failure_threshold=settings.get("api", "CIRCUIT_FAILURE_THRESHOLD", 5),
+        reset_timeout=settings.get("api", "CIRCUIT_RESET_TIMEOUT", 30),
+    )
+
+def _error_response(url, error):
+    """
+    Wraps a transport error (timeout, open circuit, ...) in a response callers can report.
+    """
+    response = requests.Response()
+    response.url = url
+    response.status_code = 503
+    response._content = str(error).encode()
+    return response
 
-    cognito_jwt_token = st.session_state.get("id_token")
+def post_with_token(url, data, id_token, retry_statuses=api_client.RETRY_STATUSES, idempotent=True):
+    """
+    Sends an authorized POST with an explicit id token. Safe to call from worker threads
+    (it never touches st.session_state). Transport failures come back as a 503 response
+    whose text describes the error. Non-idempotent calls pass api_client.THROTTLE_STATUSES
+    and idempotent=False, so nothing the endpoint may have processed is sent again.
+    """
     headers = {
-        "Authorization": f"Bearer {cognito_jwt_token}",
+        "Authorization": f"Bearer {id_token}",
         "Content-Type": "application/json"
     }
+    with tracing.span("api.post", path=urlparse(url).path) as attrs:
+        try:
+            response = get_api_client().post(
+                url, json=data, headers=headers, retry_statuses=retry_statuses, idempotent=idempotent
+            )
+        except requests.RequestException as e:
+            response = _error_response(url, e)
+        attrs.update(status=response.status_code, bytes=len(response.content))
+    return response
+
+def safe_api_post(url, data, retry_statuses=api_client.RETRY_STATUSES, idempotent=True):
+    """
+    Automatically refresh tokens if needed before sending an authorized POST request.
+    """
+    auth.refresh_tokens_if_needed()
+
+    response = post_with_token(url, data, st.session_state.get("id_token"), retry_statuses, idempotent)
 
-    response = requests.post(url, json=data, headers=headers)
-    
     # Optionally handle Unauthorized 401 error here and retry once (advanced)
     if response.status_code == 401:
-        # Try refreshing token once more and retry request
-        auth.refresh_tokens_if_needed()
-        cognito_jwt_token = st.session_state.get("id_token")
-        headers["Authorization"] = f"Bearer {cognito_jwt_token}"
-        response = requests.post(url, json=data, headers=headers)
+        # Force a token refresh and retry the request once
+        auth.refresh_tokens_if_needed(force=True)
+        response = post_with_token(url, data, st.session_state.get("id_token"), retry_statuses, idempotent)
 
     return response
 
+def _api_outcome(response, ok_status):
+    """
+    Returns (status, error) for one call of a bulk operation, where `response` is what
+    bulk_ops.run_concurrently returned for it: `ok_status` for a 200 response, otherwise
+    'failed' with the exception or the response's status and text.
+    """
+    if isinstance(response, Exception):
+        return "failed", str(response)
+    if response.status_code == 200:
+        return ok_status, None
+    return "failed", f"{response.status_code} - {response.text}"
+
 
 # ==============================
 #  MAIN FUNCTIONS
 # ==============================
 
-def add_new_coi(first_name, last_name, email, initial_token_balance, price_qty_data, access_on, is_onboarded):
-    """
-    Adds a new COI to the database via API Gateway.
-    """
-
-    api_url = "https://xuyzj7f0zd.execute-api.us-east-1.amazonaws.com/prod/add-coi"
-    data = {
+def _add_coi_payload(first_name, last_name, email, initial_token_balance, price_qty_data, access_on, is_onboarded):
+    return {
         "email": email,
         "first_name": first_name,
         "last_name": last_name,
@@ -71,54 +197,548 @@ def add_new_coi(first_name, last_name, email, initial_token_balance, price_qty_d
         "access_on": access_on,
         "is_onboarded": is_onboarded
     }
-    return safe_api_post(api_url, data)
 
 
-def delete_coi(emails):
+def add_new_coi(first_name, last_name, email, initial_token_balance, price_qty_data, access_on, is_onboarded):
     """
-    Deletes COIs by sending a newline-separated string of emails.
+    Adds a new COI to the database via API Gateway.
+    Only requests the endpoint did not process are retried: a retried 504 (the Lambda timed
+    out but may still create the user) would fail as a duplicate and lose the temporary password.
     """
 
-    api_url = "https://7893kaawd5.execute-api.us-east-1.amazonaws.com/prod/delete-coi"
-    
-    # emails is a list of emails -> join into a single string
-    email_string = "\n".join(emails)
+    data = _add_coi_payload(first_name, last_name, email, initial_token_balance, price_qty_data, access_on, is_onboarded)
+    return safe_api_post(ADD_COI_URL, data, retry_statuses=api_client.THROTTLE_STATUSES, idempotent=False)
 
-    data = {
-        "emails": email_string  # <-- send a multi-line string
+
+def bulk_add_cois(rows, progress=None):
+    """
+    Adds many COIs concurrently from rows validated by bulk_ops.validate_coi_rows.
+    Returns one result row per COI with its status, temporary password or error, and
+    refreshes the COI table once at the end.
+    """
+    auth.refresh_tokens_if_needed()
+    id_token = st.session_state.get("id_token")
+
+    def submit(row):
+        data = _add_coi_payload(
+            row["first_name"], row["last_name"], row["email"], row["initial_token_balance"],
+            row["price_qty_data"], row["access_on"], row["is_onboarded"]
+        )
+        return post_with_token(ADD_COI_URL, data, id_token, retry_statuses=api_client.THROTTLE_STATUSES, idempotent=False)
+
+    records = rows.to_dict(orient="records")
+    responses = bulk_ops.run_concurrently(records, tracing.bind(submit), max_workers=BULK_MAX_WORKERS, progress=progress)
+
+    results = []
+    for row, response in zip(records, responses):
+        status, error = _api_outcome(response, "added")
+        temporary_password = json.loads(response.text)['message'] if status == "added" else None
+        results.append({
+            "email": row["email"], "first_name": row["first_name"], "last_name": row["last_name"],
+            "status": status, "temporary_password": temporary_password, "error": error
+        })
+
+    added = [row for row, result in zip(records, results) if result["status"] == "added"]
+    apply_added_cois(added)
+    return pd.DataFrame(results)
+
+
+def delete_coi(emails, chunk_size=None, progress=None):
+    """
+    Deletes COIs by sending newline-separated strings of emails, split into chunks of
+    `chunk_size` that are sent in parallel. Returns one row per email with its chunk
+    number, status ('deleted' or 'failed') and error. The endpoint answers per request,
+    so every email of a chunk gets that chunk's status.
+    """
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    chunks = [emails[i:i + chunk_size] for i in range(0, len(emails), chunk_size)]
+
+    auth.refresh_tokens_if_needed()
+    id_token = st.session_state.get("id_token")
+
+    def submit(chunk):
+        # each chunk is a list of emails -> join into a single string
+        data = {
+            "emails": "\n".join(chunk)  # <-- send a multi-line string
+        }
+        return post_with_token(DELETE_COI_URL, data, id_token)
+
+    responses = bulk_ops.run_concurrently(chunks, tracing.bind(submit), max_workers=BULK_MAX_WORKERS, progress=progress)
+
+    results = []
+    for number, (chunk, response) in enumerate(zip(chunks, responses), start=1):
+        status, error = _api_outcome(response, "deleted")
+        results.extend({"email": email, "chunk": number, "status": status, "error": error} for email in chunk)
+    return pd.DataFrame(results, columns=["email", "chunk", "status", "error"])
+
+
+def _publish_coi_repository(change, wait_timeout=None):
+    """
+    Applies `change` (CoiRepository -> CoiRepository, returning its input when there is
+    nothing to do) to the shared COI snapshot, so edits from concurrent sessions add up, and
+    installs the result as this session's repository. Then reconciles with S3 once the
+    backend has written a version with the change: within `wait_timeout` seconds when given
+    (blocking), otherwise in the background.
+    """
+    store = get_table_store()
+    session_repo = st.session_state.coi_repo
+    built = []  # Repositories made by `change`, installed below instead of indexing again
+
+    def apply(df):
+        # Usually this session's repository is built on the shared snapshot: reuse its indexes
+        repo = session_repo if session_repo.df is df else coi_repository.CoiRepository(df)
+        repo = change(repo)
+        built.append(repo)
+        return repo.df
+
+    df, version, pending = store.update(COI_TABLE_NAME, apply)
+    repo = next((r for r in reversed(built) if r.df is df), None)
+    if repo is not None and repo.version != version:
+        if repo is session_repo:
+            repo = None  # Shared with other sessions under its own version
+        else:
+            repo.version = version  # Made by `change` for this update only
+    st.session_state.coi_repo = _build_coi_repository(version, df, repo)
+    if pending is None:
+        return  # The shared snapshot already had the change, e.g. from a reconcile
+
+    if wait_timeout:
+        with st.spinner("Waiting for the COI table to update..."):
+            if store.reconcile(COI_TABLE_NAME, timeout=wait_timeout, update=pending):
+                st.session_state.coi_repo = load_coi_repository()
+                return
+    store.reconcile_in_background(COI_TABLE_NAME)
+
+
+def evict_cois(emails):
+    """
+    Removes deleted COIs from the shared COI snapshot and this session's repository,
+    instead of re-downloading the table from S3.
+    """
+    _publish_coi_repository(lambda repo: repo.without(emails))
+
+
+def apply_added_cois(rows):
+    """
+    Appends newly added COIs (dicts with the add-coi fields) to the shared COI snapshot and
+    waits up to WRITE_WAIT_SECONDS for the backend's version, which fills in the generated
+    columns (uid, email_hash) needed for token adjustments. COIs the snapshot already holds
+    (the backend's version was picked up first) are not added again.
+    """
+    _publish_coi_repository(
+        lambda repo: repo.with_rows([row for row in rows if row["email"] not in repo]),
+        wait_timeout=WRITE_WAIT_SECONDS
+    )
+
+
+def apply_coi_changes(changes):
+    """
+    Applies saved COI edits (rows from coi_row_changes) to the shared COI snapshot.
+    """
+    _publish_coi_repository(lambda repo: repo.with_changes(changes))
+
+
+def sync_coi_repository():
+    """
+    Picks up a newer shared COI snapshot (e.g. one downloaded by a background reconcile or
+    by the watcher after a failed first load) for this session. Never touches S3.
+    """
+    store = get_table_store()
+    version = store.version(COI_TABLE_NAME)
+    repo = st.session_state.get("coi_repo")
+    if repo is None or version is None or repo.version == version:
+        return
+    # Any held snapshot is newer than the session's, even one that is due for revalidation
+    df = store.peek(COI_TABLE_NAME, fresh=False)
+    if df is not None:
+        st.session_state.coi_repo = load_coi_repository(df)
+
+
+def _default_table_updates():
+    """
+    Returns [(key, version, df)] for the default price and banks tables whose shared
+    snapshot is newer than this session's copy. The banks table waits while its editor in
+    "Adjust default settings" holds unsaved edits (they are keyed by row position).
+    """
+    store = get_table_store()
+    seen = st.session_state.get("default_table_versions", {})
+    updates = []
+    for key in (DEFAULT_TOKEN_PRICES_DF_NAME, DEFAULT_BANKS_DF_NAME):
+        version = store.version(key)
+        if version is None or seen.get(key) == version:
+            continue
+        editor_keys = st.session_state.get("editor_keys", {})
+        if key == DEFAULT_BANKS_DF_NAME and "banks" in editor_keys and editor_changes(editor_keys["banks"])["has_changes"]:
+            continue
+        df = store.peek(key, fresh=False)
+        if df is not None:
+            updates.append((key, version, df))
+    return updates
+
+
+def price_qty_changed():
+    """
+    True when the session's working copy of the prices differs from the default prices.
+    Both are lists of records (or empty DataFrames when the default table failed to load).
+    """
+    working = st.session_state.get("price_qty_data")
+    default = st.session_state.get("default_price_qty_data")
+    if isinstance(working, pd.DataFrame) or isinstance(default, pd.DataFrame):
+        return not (isinstance(working, pd.DataFrame) and isinstance(default, pd.DataFrame) and working.equals(default))
+    return not pd.DataFrame(working).equals(pd.DataFrame(default))
+
+
+def sync_default_tables():
+    """
+    Picks up newer shared versions of the default price and banks tables (e.g. loaded by
+    the watcher) for this session. The working copy of the prices is replaced only if it
+    still equals the old defaults. Never touches S3.
+    """
+    updates = _default_table_updates()
+    seen = st.session_state.setdefault("default_table_versions", {})
+    for key, version, df in updates:
+        if key == DEFAULT_TOKEN_PRICES_DF_NAME:
+            records = df.to_dict(orient="records")
+            if not price_qty_changed():
+                st.session_state.price_qty_data = records
+                st.session_state.initial_price_qty_data = records
+            st.session_state.default_price_qty_data = records
+        else:
+            st.session_state.default_banks_df = df
+            st.session_state.initial_banks_df = df
+        seen[key] = version
+
+
+def adjust_tokens(email, email_hash, coi_id, num_tokens, transaction_type="Token adjustment"):
+    """
+    Records a token adjustment for one COI via API Gateway.
+    Only throttled requests and failed connections are retried, so an adjustment is never
+    applied twice.
+    """
+    payload = {
+        'action': 'update transactions_df.parquet',
+        'coi_email': email,
+        'email_hash': email_hash,
+        'coi_id': coi_id,
+        'num_tokens': num_tokens,
+        'transaction_type': transaction_type
     }
+    response = safe_api_post(ADJUST_TOKENS_URL, payload, retry_statuses=api_client.THROTTLE_STATUSES, idempotent=False)
+    invalidate_transactions()
+    return response
+
+def batch_adjust_tokens(rows, progress=None):
+    """
+    Sends many token adjustments concurrently from rows validated by
+    bulk_ops.validate_token_adjustments. Returns one outcome row per adjustment and
+    reloads the transactions once at the end.
+    """
+    auth.refresh_tokens_if_needed()
+    id_token = st.session_state.get("id_token")
+
+    def submit(row):
+        payload = {
+            'action': 'update transactions_df.parquet',
+            'coi_email': row["email"],
+            'email_hash': row["email_hash"],
+            'coi_id': row["uid"],
+            'num_tokens': row["num_tokens"],
+            'transaction_type': row["transaction_type"]
+        }
+        return post_with_token(
+            ADJUST_TOKENS_URL, payload, id_token, retry_statuses=api_client.THROTTLE_STATUSES, idempotent=False
+        )
+
+    records = rows.to_dict(orient="records")
+    responses = bulk_ops.run_concurrently(records, tracing.bind(submit), max_workers=BULK_MAX_WORKERS, progress=progress)
+
+    results = []
+    for row, response in zip(records, responses):
+        status, error = _api_outcome(response, "ok")
+        results.append({
+            "email": row["email"], "num_tokens": row["num_tokens"], "transaction_type": row["transaction_type"],
+            "status": status, "error": error
+        })
+
+    invalidate_transactions()
+    return pd.DataFrame(results)
+
+
+def coi_row_changes(coi_df, edited_rows):
+    """
+    Builds one row per COI edited in the data editor, from the editor's `edited_rows`
+    delta ({row_position: {column: new_value}}). Each row holds COI_CHANGE_COLUMNS plus
+    any other edited column, with the edits applied.
+    """
+    if not edited_rows:
+        return coi_df.iloc[0:0][[c for c in COI_CHANGE_COLUMNS if c in coi_df.columns]]
+
+    positions = sorted(int(position) for position in edited_rows)
+    changes = coi_df.iloc[positions].copy()
+    for position, edits in edited_rows.items():
+        label = coi_df.index[int(position)]
+        for column, value in edits.items():
+            if column in changes.columns:
+                changes.at[label, column] = value
+
+    edited_columns = {column for edits in edited_rows.values() for column in edits}
+    columns = [c for c in changes.columns if c in COI_CHANGE_COLUMNS or c in edited_columns]
+    return changes[columns]
+
+
+def _upload_parquet(key, df):
+    with tracing.span("parquet.write", key=key, rows=len(df)) as attrs:
+        buffer = BytesIO()
+        df.to_parquet(buffer, index=False)
+        attrs["bytes"] = buffer.tell()
+    STORAGE.put(key, buffer.getvalue())
+
+def save_coi_changes(changes, repo):
+    """
+    Sends the changed COI rows (from coi_row_changes) to change-coi-data in the
+    COI_CHANGES_FORMAT the Lambda expects. `repo` is the CoiRepository the edits were
+    made on; the "row" format uploads it with the changes applied.
+    Returns the response of the batched call, or of the first row call that fails.
+    """
+    rows = json.loads(changes.to_json(orient="records", date_format="iso"))
+
+    if COI_CHANGES_FORMAT == "batch":
+        _upload_parquet(COI_DELTA_TABLE_NAME, changes)
+        return safe_api_post(CHANGE_COI_DATA_URL, {"rows": rows})
+
+    _upload_parquet(COI_TEMP_TABLE_NAME, repo.with_changes(changes).df)
+    response = None
+    for row in rows:
+        response = safe_api_post(CHANGE_COI_DATA_URL, {c: row[c] for c in COI_CHANGE_COLUMNS if c in row})
+        if response.status_code != 200:
+            break
+    return response
 
-    return safe_api_post(api_url, data)
+def put_table(key, df):
+    """
+    Writes a table to the storage and installs it as the shared snapshot straight away:
+    the new ETag becomes the snapshot version and the decoded frame is kept by the
+    storage, so nothing is downloaded or decoded again.
+    """
+    with tracing.span("parquet.write", key=key, rows=len(df)) as attrs:
+        buffer = BytesIO()
+        df.to_parquet(buffer, index=False)
+        body = buffer.getvalue()
+        attrs["bytes"] = len(body)
+
+    if COMPACT_DTYPES:
+        df = compact_frames.compact_frame(df, categorical=_is_read_only(key), downcast=_is_read_only(key))
+    meta = STORAGE.put(key, body, df)
+    get_table_store().replace(key, df, etag=meta["etag"], version_id=meta["version_id"])
+
+def editor_changes(key):
+    """
+    Reports what the user changed in the st.data_editor with widget `key`, read from the
+    editor's own delta state rather than by comparing frames. Returns a dict with
+    'has_changes', the positions of 'edited_rows' and 'deleted_rows' and the number of
+    'added_rows'.
+    """
+    state = st.session_state.get(key) or {}
+    edited = state.get("edited_rows") or {}
+    added = state.get("added_rows") or []
+    deleted = state.get("deleted_rows") or []
+    return {
+        "has_changes": bool(edited or added or deleted),
+        "edited_rows": sorted(int(position) for position in edited),
+        "added_rows": len(added),
+        "deleted_rows": sorted(deleted),
+    }
 
 def increment_counter():
     st.session_state.counter += 1
 
-@st.cache_data(show_spinner="Loading COI Table...")
-def load_coi_table(counter=None):
+def _is_read_only(key):
+    # Only read-only tables get categories and downcast numbers: a category column in
+    # st.data_editor accepts existing values only, and an int8 balance would wrap or
+    # reject larger values, in the COI, price and banks tables
+    return key == TRANSACTIONS_TABLE_NAME
+
+def _read_compact(key, source):
+    return compact_frames.read_parquet(source, categorical=_is_read_only(key), downcast=_is_read_only(key))
+
+@st.cache_resource
+def get_table_store():
+    """
+    Returns the process-wide snapshot store shared by every admin session.
+    """
+    reader = _read_compact if COMPACT_DTYPES else None
+    return table_store.TableStore(STORAGE, ttl=TABLE_TTL_SECONDS, reader=reader)
+
+def table_memory_report():
+    """
+    Measures each stored table decoded with default and with compact dtypes.
+    Returns one row per table with rows, default_bytes, compact_bytes and saving.
+    Tables that are not available locally (S3) are downloaded once and compacted in memory.
+    """
+    rows = []
+    for key in [COI_TABLE_NAME, TRANSACTIONS_TABLE_NAME, DEFAULT_TOKEN_PRICES_DF_NAME, DEFAULT_BANKS_DF_NAME]:
+        source = STORAGE.source(key)
+        if source is not None:
+            report = compact_frames.memory_report(source, categorical=_is_read_only(key), downcast=_is_read_only(key))
+        elif STORAGE.head(key) is not None:
+            default = STORAGE.read_parquet(key)
+            report = compact_frames.compare(default, compact_frames.compact_frame(
+                default, categorical=_is_read_only(key), downcast=_is_read_only(key)
+            ))
+        else:
+            continue
+        rows.append({"table": key, **report})
+    return pd.DataFrame(rows, columns=["table", "rows", "default_bytes", "compact_bytes", "saving"])
+
+@st.cache_resource
+def get_table_watcher():
+    """
+    Starts the process-wide watcher that keeps the shared snapshots current: the COI and
+    default tables are reloaded when S3 has a new version, and the balance index picks up
+    new transactions. Returns None when WATCH_INTERVAL_SECONDS is 0.
+    """
+    if not WATCH_INTERVAL_SECONDS:
+        return None
+
+    keys = [COI_TABLE_NAME, DEFAULT_TOKEN_PRICES_DF_NAME, DEFAULT_BANKS_DF_NAME]
+    if not TRANSACTIONS_PREFIX:
+        keys.append(TRANSACTIONS_TABLE_NAME)
+    index = get_balance_index()
+
+    def on_change(key):
+        if key == TRANSACTIONS_TABLE_NAME:
+            _refresh_balance_index(index)
+
+    watcher = table_store.TableWatcher(
+        get_table_store(), keys, interval=WATCH_INTERVAL_SECONDS, on_change=on_change,
+        load=(COI_TABLE_NAME, DEFAULT_TOKEN_PRICES_DF_NAME, DEFAULT_BANKS_DF_NAME)
+    )
+    return watcher.start()
+
+def has_newer_data():
+    """
+    True when the watcher has loaded a COI table, default tables or token balances newer
+    than the ones this session last rendered (and the next run will pick them up). Never
+    touches S3.
+    """
+    repo = st.session_state.get("coi_repo")
+    if repo is not None and get_table_store().version(COI_TABLE_NAME) not in (None, repo.version):
+        return True
+    if _default_table_updates():
+        return True
+    seen = st.session_state.get("coi_table_view")
+    return seen is not None and seen[1] != get_balance_index().version
+
+def invalidate_tables(*keys):
+    """
+    Forces the given S3 tables (all of them if none given) to be revalidated on next load.
+    """
+    get_table_store().invalidate(*keys)
+    if not keys or TRANSACTIONS_TABLE_NAME in keys:
+        get_balance_index().checked_at = float("-inf")
+
+def invalidate_transactions():
+    """
+    Drops every cached view of the transactions table (snapshot, explorer queries, balances).
+    """
+    invalidate_tables(TRANSACTIONS_TABLE_NAME)
+    query_transactions.clear()
+    transactions_filter_options.clear()
+
+def load_coi_table():
     """
     Loads the COI table from S3 and returns it as a DataFrame.
+    The returned frame is a shared snapshot: copy it before modifying.
     """
 
     try:
-        response = S3_CLIENT.get_object(Bucket=BUCKET_NAME, Key=COI_TABLE_NAME)
-        data = response['Body'].read()
-        return pd.read_parquet(BytesIO(data))
+        with st.spinner("Loading COI Table..."):
+            return get_table_store().get(COI_TABLE_NAME)
 
     except Exception as e:
         st.error(f"Error loading COI table: {e}")
         st.write(COI_TABLE_NAME)
         return pd.DataFrame()  # Return empty DataFrame on error
 
-@st.cache_data(show_spinner="Loading default price Table...")
-def load_default_price_data(counter=None):
+@st.cache_resource(max_entries=2)
+def _build_coi_repository(version, _df, _repo=None):
+    # `_repo`, when given, is an already indexed repository of `_df` to share for `version`
+    return _repo if _repo is not None else coi_repository.CoiRepository(_df, version)
+
+def load_coi_repository(df=None):
+    """
+    Returns the shared CoiRepository for the current COI snapshot.
+    Indexes are built once per S3 version and reused by every session.
     """
-    Loads the default price table from S3 and returns it as a DataFrame.
+    if df is None:
+        df = load_coi_table()
+    version = get_table_store().version(COI_TABLE_NAME)
+    if df.empty or version is None:
+        return coi_repository.CoiRepository(df, version)
+    return _build_coi_repository(version, df)
+
+@st.cache_resource
+def get_balance_index():
+    """
+    Returns the process-wide per-COI balance index, cached alongside the COI table.
+    """
+    return balances.BalanceIndex(date_column=TRANSACTIONS_DATE_COLUMN)
+
+def load_coi_balances():
+    """
+    Returns the per-COI token balance summary (indexed by uid), reading only transactions
+    added since the last refresh. Refreshed at most every TABLE_TTL_SECONDS.
+    """
+    index = get_balance_index()
+    if time.monotonic() - index.checked_at < TABLE_TTL_SECONDS:
+        return index.summary
+
+    try:
+        _refresh_balance_index(index)
+
+    except Exception as e:
+        st.error(f"Error loading token balances: {e}")
+        index.checked_at = time.monotonic()
+
+    return index.summary
+
+def _refresh_balance_index(index):
+    if TRANSACTIONS_PREFIX:
+        index.refresh_partitions(STORAGE, TRANSACTIONS_PREFIX)
+    else:
+        index.refresh_object(STORAGE, TRANSACTIONS_TABLE_NAME)
+    index.checked_at = time.monotonic()
+
+def coi_table_view(coi_df):
+    """
+    Returns coi_df with the token balance columns joined on uid.
+    The join is memoised per session until the COI snapshot or the balance index changes.
+    """
+    if coi_df.empty or "uid" not in coi_df.columns:
+        return coi_df
+
+    summary = load_coi_balances()
+    version = get_balance_index().version
+
+    cached = st.session_state.get("coi_table_view")
+    if cached and cached[0] is coi_df and cached[1] == version:
+        return cached[2]
+
+    view = coi_df.join(summary[balances.BALANCE_COLUMNS], on="uid")
+    counts = ["token_balance", "tokens_added", "tokens_used", "n_transactions"]
+    view[counts] = view[counts].fillna(0)
+
+    st.session_state.coi_table_view = (coi_df, version, view)
+    return view
+
+def load_default_price_data():
+    """
+    Loads the default price table from S3 and returns it as a list of records.
     """
     key = DEFAULT_TOKEN_PRICES_DF_NAME
     try:
-        response = S3_CLIENT.get_object(Bucket=BUCKET_NAME, Key=key)
-        data = response['Body'].read()
-        price_qty_df = pd.read_parquet(BytesIO(data))
+        with st.spinner("Loading default price Table..."):
+            price_qty_df = get_table_store().get(key)
         return price_qty_df.to_dict(orient='records')
     
     except Exception as e:
@@ -127,35 +747,29 @@ def load_default_price_data(counter=None):
 
 @st.cache_data()   
 def load_logo():
-    image = Image.open("assets/eureka_logo.jpeg")
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    return  base64.b64encode(buffered.getvalue()).decode()
-    
-@st.cache_data()
-def load_transactions_df(counter=None):
     """
-    Loads the transactions table from S3 and returns it as a DataFrame.
+    Returns the header logo as base64 PNG. The PNG ships pre-encoded at twice the displayed
+    size (see LOGO_PNG); the full-size JPEG is only converted, with PIL, if it is missing.
     """
-    try:
-        response = S3_CLIENT.get_object(Bucket=BUCKET_NAME, Key=TRANSACTIONS_TABLE_NAME)
-        data = response['Body'].read()
-        return pd.read_parquet(BytesIO(data))
-
-    except Exception as e:
-        st.error(f"Error loading COI table: {e}")
-        return pd.DataFrame()  # Return empty DataFrame on error
+    if os.path.exists(LOGO_PNG):
+        with open(LOGO_PNG, "rb") as f:
+            return base64.b64encode(f.read()).decode()
 
-@st.cache_data()   
-def load_default_banks_df(counter=None):
+    from PIL import Image
+    image = Image.open(LOGO_JPEG)
+    image.thumbnail(LOGO_SIZE)
+    buffered = BytesIO()
+    image.save(buffered, format="PNG", optimize=True)
+    return  base64.b64encode(buffered.getvalue()).decode()
+    
+def load_default_banks_df():
     """
     Loads the default banks table from S3 and returns it as a DataFrame.
+    The returned frame is a shared snapshot: copy it before modifying.
     """
     key = DEFAULT_BANKS_DF_NAME
     try:
-        response = S3_CLIENT.get_object(Bucket=BUCKET_NAME, Key=key)
-        data = response['Body'].read()
-        return pd.read_parquet(BytesIO(data))
+        return get_table_store().get(key)
     
     except Exception as e:
         st.error(f"Error loading default banks table: {e}")
@@ -165,38 +779,212 @@ def load_default_banks_df(counter=None):
     
 
 
-def update_coi_df_on_submit(df, response, coi_table_container):
+def read_table(key, columns=None, filters=None):
     """
-    After a successful add/delete API call:
-    - Clears the cache
-    - Reloads the updated COI table
-    - Updates the UI container with the new table
+    Returns only the requested columns of the rows matching `filters` from a stored table.
+
+    Served from the shared snapshot when one is already in memory; otherwise only the
+    parquet footer and the needed row groups/columns are read (ranged GETs on S3).
+    `filters` uses the pd.read_parquet format, e.g. [("email", "==", email)].
     """
+    df = get_table_store().peek(key)
+    if df is None:
+        return STORAGE.read_parquet(
+            key, columns=columns, filters=filters, compact=COMPACT_DTYPES, categorical=_is_read_only(key)
+        )
 
-    if response.status_code == 200:
-        placeholder = st.empty()
+    df = s3_parquet.filter_frame(df, filters)
+    return df[list(columns)] if columns is not None else df
 
-        # Clear cached load_coi_table
-        load_coi_table.clear()
 
-        # Reload fresh data
-        fresh_df = load_coi_table()
-        st.session_state.coi_df = fresh_df.copy()
+def read_transactions(columns=None, filters=None):
+    """
+    Returns the requested columns of the transactions matching `filters`.
+    With TRANSACTIONS_PREFIX set, only the month/COI partitions that can match are read.
+    """
+    if TRANSACTIONS_PREFIX:
+        return transactions_store.read(
+            STORAGE, TRANSACTIONS_PREFIX,
+            columns=columns, filters=filters, date_column=TRANSACTIONS_DATE_COLUMN,
+            compact=COMPACT_DTYPES, categorical=_is_read_only(TRANSACTIONS_TABLE_NAME)
+        )
+    return read_table(TRANSACTIONS_TABLE_NAME, columns=columns, filters=filters)
+
+def compact_transactions(min_files=2):
+    """
+    Merges the small appended transaction files of each partition (partitioned layout only).
+    """
+    n = transactions_store.compact(STORAGE, TRANSACTIONS_PREFIX, min_files=min_files)
+    query_transactions.clear()
+    return n
 
-        coi_table_container.dataframe(fresh_df)
+@st.cache_data(ttl=TABLE_TTL_SECONDS, show_spinner=False)
+def transactions_filter_options():
+    """
+    Returns what the transactions explorer can filter on: the date column and its arrow
+    type (None if the table has no date column) and the distinct transaction types.
+    Only the parquet footer and the transaction_type column are read.
+    """
+    if TRANSACTIONS_PREFIX:
+        schema = transactions_store.read_schema(STORAGE, TRANSACTIONS_PREFIX)
+    else:
+        schema = STORAGE.read_schema(TRANSACTIONS_TABLE_NAME)
 
-        st.success("Operation successful!")
+    date_fields = [f for f in schema if pa.types.is_timestamp(f.type) or pa.types.is_date(f.type)]
+    if TRANSACTIONS_DATE_COLUMN in schema.names:
+        date_field = schema.field(TRANSACTIONS_DATE_COLUMN)
+    else:
+        date_field = date_fields[0] if date_fields else None
 
-        placeholder.empty()
+    transaction_types = []
+    if "transaction_type" in schema.names:
+        types_df = read_transactions(columns=["transaction_type"])
+        transaction_types = sorted(types_df["transaction_type"].dropna().unique().tolist())
 
-    else:
-        st.error(f"Error: {response.status_code} - {response.text}")
+    return {
+        "date_column": date_field.name if date_field is not None else None,
+        "date_type": date_field.type if date_field is not None else None,
+        "transaction_types": transaction_types,
+    }
 
-def reload(coi_df=False, trans_df = False):
+def _date_bound(date_type, value):
+    """
+    Converts a date picked in the UI to a value comparable with a column of `date_type`.
+    """
+    if pa.types.is_timestamp(date_type):
+        bound = pd.Timestamp(value)
+        return bound.tz_localize(date_type.tz) if date_type.tz else bound
+    if pa.types.is_date(date_type):
+        return value
+    return value.isoformat()  # ISO strings compare in date order
+
+def transactions_filters(coi=None, transaction_types=None, date_range=None, options=None):
+    """
+    Builds pd.read_parquet-style filters for the transactions explorer.
+    `coi` matches either coi_email or coi_id; `date_range` is an inclusive (start, end) pair.
+    """
+    common = []
+    if transaction_types:
+        common.append(("transaction_type", "in", list(transaction_types)))
+
+    if date_range and options and options["date_column"]:
+        column, date_type = options["date_column"], options["date_type"]
+        start, end = date_range[0], date_range[-1]
+        common.append((column, ">=", _date_bound(date_type, start)))
+        common.append((column, "<", _date_bound(date_type, end + timedelta(days=1))))
+
+    if coi:
+        return [[("coi_email", "==", coi)] + common, [("coi_id", "==", coi)] + common]
+    return common or None
+
+@st.cache_resource(ttl=TABLE_TTL_SECONDS, max_entries=32, show_spinner="Loading transactions...")
+def query_transactions(filters=None):
+    """
+    Returns the transactions matching `filters`, pushing the filters down into the parquet scan.
+    The result is shared by every session and rerun without copying (paging is a slice of
+    it): treat it as read-only.
+    """
+    try:
+        return read_transactions(filters=filters)
+
+    except Exception as e:
+        st.error(f"Error loading transactions table: {e}")
+        return pd.DataFrame()  # Return empty DataFrame on error
+
+
+def load_all_tables():
+    """
+    Loads the default price, COI and default banks tables concurrently.
+    Returns a dict with keys 'price_qty_data', 'coi_df' and 'banks_df';
+    a table that fails to load is reported with st.error and returned empty.
+    Transactions are not loaded here: the explorer queries them on demand.
+    """
+    tables = {
+        "price_qty_data": (DEFAULT_TOKEN_PRICES_DF_NAME, "default price table"),
+        "coi_df": (COI_TABLE_NAME, "COI table"),
+        "banks_df": (DEFAULT_BANKS_DF_NAME, "default banks table"),
+    }
+    store = get_table_store()
+    results = {}
+
+    with st.spinner("Loading tables..."):
+        with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+            futures = {name: pool.submit(tracing.bind(store.get), key) for name, (key, _) in tables.items()}
+
+            # st.* calls must stay on the script thread, so errors are reported here
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    st.error(f"Error loading {tables[name][1]}: {e}")
+                    results[name] = pd.DataFrame()  # Return empty DataFrame on error
+
+    if not results["price_qty_data"].empty:
+        results["price_qty_data"] = results["price_qty_data"].to_dict(orient='records')
+    return results
+
+
+def reload(coi_df=False, trans_df = False, defaults=False):
     increment_counter()
     if coi_df:
-        load_coi_table.clear()
-        st.session_state.coi_df = load_coi_table(counter=st.session_state.counter)
+        invalidate_tables(COI_TABLE_NAME)
+        st.session_state.coi_repo = load_coi_repository()
     if trans_df:
-        trans_df = load_transactions_df(counter=st.session_state.counter)
-    st.rerun()
\ No newline at end of file
+        invalidate_transactions()
+    if defaults:
+        invalidate_tables(DEFAULT_TOKEN_PRICES_DF_NAME, DEFAULT_BANKS_DF_NAME)
+        load_default_price_data()
+        load_default_banks_df()  # Both fetch into the shared store; sync_default_tables installs them
+    st.rerun()
+
+def rerun_panel():
+    """
+    Reruns only the calling @st.fragment panel; falls back to a full rerun when the
+    current run is not a fragment rerun (e.g. the first run of the page).
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def start_trace(label="rerun"):
+    """
+    Starts collecting this rerun's spans and keeps the trace in the session's history
+    (the last TRACE_HISTORY reruns). Call once at the top of the page script and
+    finish() the returned trace at its end.
+    """
+    trace = tracing.start_rerun(label)
+    if "traces" not in st.session_state:
+        st.session_state.traces = deque(maxlen=TRACE_HISTORY)
+    st.session_state.traces.append(trace)
+    return trace
+
+def traced_fragment(func):
+    """
+    Decorator for @st.fragment panels: a rerun of the fragment alone gets its own trace,
+    while in a full run the panel's spans stay in the page's trace.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        if ctx is None or not ctx.fragment_ids_this_run:
+            return func(*args, **kwargs)
+
+        trace = start_trace(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            trace.finish()
+    return run
+
+def trace_tables(trace):
+    """
+    Returns (per-span totals of `trace`, process-wide counters) as DataFrames for the timing panel.
+    """
+    columns = ["span", "count", "ms", "bytes", "rows"]
+    spans = pd.DataFrame(trace.summary(), columns=columns).sort_values("ms", ascending=False)
+    counters = pd.DataFrame(
+        [{"span": name, **counter} for name, counter in sorted(tracing.counters().items())],
+        columns=["span", "count", "errors", "ms", "bytes", "rows"]
+    )
+    return spans, counters
@@ -0,0 +1,144 @@
+# api_client.py
+
+import time
+import random
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Statuses retried by default; 429/503 mean the request was not processed, so
+# non-idempotent calls (e.g. token adjustments) should retry only on those
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+
+
+def _not_sent(error):
+    """
+    True if a connection error happened before the request reached the server (the
+    connection could not be opened), as opposed to e.g. the server dropping it mid-call.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of sending a request while a host's circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one host.
+    After `failure_threshold` failed calls the circuit opens for `reset_timeout` seconds;
+    then a single trial call is let through and closes it again on success.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self, host):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit open for {host}: too many recent failures, try again shortly")
+            self.opened_at = time.monotonic()  # Half-open: let this call through, hold back the others
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ApiClient:
+    """
+    Shared HTTP client for the API Gateway endpoints.
+
+    Keeps TCP/TLS connections alive in a per-host pool, applies (connect, read) timeouts
+    to every call, retries 429/5xx and failed connections with exponential backoff and
+    full jitter (honouring Retry-After), and trips a per-host circuit breaker.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30, max_retries=3, backoff_base=0.5,
+                 backoff_max=8, pool_maxsize=10, failure_threshold=5, reset_timeout=30):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+
+    def _breaker(self, host):
+        with self._breakers_lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def _backoff(self, attempt, response):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def post(self, url, json=None, headers=None, retry_statuses=RETRY_STATUSES, idempotent=True):
+        """
+        POSTs `json` to `url` and returns the final response.
+        Failures to connect are retried. Read timeouts are raised without a retry, since
+        the endpoint may already have acted on the request; so are other connection errors
+        (e.g. the server closing the connection after reading the request) unless the
+        call is `idempotent`.
+        """
+        host = urlparse(url).netloc
+        breaker = self._breaker(host)
+        breaker.before_call(host)
+
+        for attempt in range(self.max_retries + 1):
+            error, response = None, None
+            try:
+                response = self.session.post(url, json=json, headers=headers, timeout=self.timeout)
+            except requests.ReadTimeout:
+                breaker.record_failure()
+                raise
+            except requests.ConnectionError as e:
+                if not idempotent and not _not_sent(e):
+                    breaker.record_failure()
+                    raise
+                error = e
+
+            if response is not None and response.status_code not in retry_statuses:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                return response
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+
+        breaker.record_failure()
+        if response is None:
+            raise error
+        return response
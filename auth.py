@@ -1,23 +1,149 @@
 import streamlit as st
-import boto3
 import requests
 import time
-from jose import jwt
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
+import aws_clients
+import settings
+import tracing
 
-# Initialize the Cognito boto3 client once globally
-cognito_client = boto3.client(
+# The user pool's region (the API Gateway endpoints live in us-east-1 too)
+REGION = settings.get("cognitoClient", "REGION", "us-east-1")
+
+# The Cognito boto3 client, created on the first sign-in or refresh and shared by all sessions
+cognito_client = aws_clients.lazy(
     'cognito-idp',
-    region_name=st.secrets["cognitoClient"]["REGION"],
-    aws_access_key_id=st.secrets["cognitoClient"]["AWS_ACCESS_KEY_ID"],
-    aws_secret_access_key=st.secrets["cognitoClient"]["AWS_SECRET_ACCESS_KEY"],
+    region_name=REGION,
+    aws_access_key_id=settings.get("cognitoClient", "AWS_ACCESS_KEY_ID"),
+    aws_secret_access_key=settings.get("cognitoClient", "AWS_SECRET_ACCESS_KEY"),
+    endpoint_url=settings.get("cognitoClient", "ENDPOINT_URL"),  # e.g. a local stand-in
 )
 
 # Secrets for your Cognito App
-USER_POOL_ID = st.secrets["cognito"]["user_pool_id"]
-CLIENT_ID = st.secrets["cognito"]["client_id"]
-COGNITO_DOMAIN = st.secrets["cognito"]["domain"]  # if needed for future
-REDIRECT_URI = st.secrets["cognito"]["redirect_uri"]  # if needed for future
+USER_POOL_ID = settings.get("cognito", "user_pool_id")
+CLIENT_ID = settings.get("cognito", "client_id")
+COGNITO_DOMAIN = settings.get("cognito", "domain")  # if needed for future
+REDIRECT_URI = settings.get("cognito", "redirect_uri")  # if needed for future
+
+# Public signing keys of the user pool, used to verify tokens locally
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}"
+JWKS_URL = settings.get("cognito", "jwks_url", f"{ISSUER}/.well-known/jwks.json")
+JWKS_TTL_SECONDS = 24 * 3600
+
+# Tokens are refreshed in the background once they expire within PROACTIVE_REFRESH_SECONDS;
+# callers only wait for a refresh inside the last REFRESH_MARGIN_SECONDS
+PROACTIVE_REFRESH_SECONDS = 600
+REFRESH_MARGIN_SECONDS = 300
+
+# Shared scheduler for background token refreshes (one per process)
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="token-refresh")
+
+_JWKS = {"keys": {}, "fetched_at": float("-inf")}
+_JWKS_LOCK = threading.Lock()
+
+
+# ==============================
+#  TOKEN VERIFICATION
+# ==============================
+
+def _signing_key(kid):
+    """
+    Returns the JWK for `kid` from the cached JWKS, refetching it when stale or when the
+    key is unknown (the pool rotated its keys). A stale copy is reused if the fetch fails.
+    """
+    from jose import jwt  # Deferred: only needed once someone signs in
+    with _JWKS_LOCK:
+        stale = time.monotonic() - _JWKS["fetched_at"] > JWKS_TTL_SECONDS
+        if stale or kid not in _JWKS["keys"]:
+            try:
+                response = requests.get(JWKS_URL, timeout=(3.05, 10))
+                response.raise_for_status()
+                _JWKS["keys"] = {key["kid"]: key for key in response.json()["keys"]}
+                _JWKS["fetched_at"] = time.monotonic()
+            except (requests.RequestException, ValueError, KeyError):
+                if kid not in _JWKS["keys"]:
+                    raise
+        if kid not in _JWKS["keys"]:
+            raise jwt.JWTError(f"Unknown signing key: {kid}")
+        return _JWKS["keys"][kid]
+
+
+def verify_token(id_token, access_token=None):
+    """
+    Verifies the id token's signature, issuer and audience locally against the cached
+    JWKS and returns its claims. Expiry is not enforced here: TokenManager refreshes
+    tokens before they expire.
+    """
+    from jose import jwt
+    key = _signing_key(jwt.get_unverified_header(id_token)["kid"])
+    return jwt.decode(
+        id_token,
+        key,
+        algorithms=["RS256"],
+        audience=CLIENT_ID,
+        issuer=ISSUER,
+        access_token=access_token,
+        options={"verify_exp": False},
+    )
+
+
+class TokenManager:
+    """
+    Holds one session's Cognito tokens together with the id token's verified expiry.
+
+    Checking the tokens is a clock comparison. Once the id token is within
+    PROACTIVE_REFRESH_SECONDS of expiry a refresh is scheduled on the shared background
+    pool; a lock makes concurrent callers share that single refresh. Callers only block
+    on it when the token is inside REFRESH_MARGIN_SECONDS (or forced, e.g. after a 401).
+    """
+
+    def __init__(self, id_token, access_token, refresh_token):
+        self.refresh_token = refresh_token
+        self._lock = threading.Lock()
+        self._future = None
+        self._set_tokens(id_token, access_token)
+
+    def _set_tokens(self, id_token, access_token):
+        claims = verify_token(id_token, access_token)
+        self.id_token = id_token
+        self.access_token = access_token
+        self.expires_at = claims["exp"]
+
+    def _refresh(self):
+        with tracing.span("cognito.refresh"):
+            response = cognito_client().admin_initiate_auth(
+                UserPoolId=USER_POOL_ID,
+                ClientId=CLIENT_ID,
+                AuthFlow='REFRESH_TOKEN_AUTH',
+                AuthParameters={
+                    'REFRESH_TOKEN': self.refresh_token
+                }
+            )
+            result = response['AuthenticationResult']
+            self._set_tokens(result['IdToken'], result['AccessToken'])
+        self.refresh_token = result.get('RefreshToken', self.refresh_token)
+
+    def refresh_async(self):
+        """
+        Schedules a refresh unless one is already running, and returns its future.
+        """
+        with self._lock:
+            if self._future is None or self._future.done():
+                self._future = _REFRESH_POOL.submit(self._refresh)
+            return self._future
+
+    def ensure_fresh(self, force=False, timeout=30):
+        """
+        Makes sure the tokens stay usable: schedules a background refresh ahead of
+        expiry, and waits for it only when the token is about to expire (or `force`).
+        Raises if a refresh the caller had to wait for failed.
+        """
+        remaining = self.expires_at - time.time()
+        if force or remaining < PROACTIVE_REFRESH_SECONDS:
+            future = self.refresh_async()
+            if force or remaining < REFRESH_MARGIN_SECONDS:
+                future.result(timeout=timeout)
 
 
 def get_tokens_directly_admin_auth(email, password):
@@ -25,8 +151,9 @@ def get_tokens_directly_admin_auth(email, password):
     Authenticate user using AdminInitiateAuth and save tokens in session state.
     """
 
+    client = cognito_client()
     try:
-        response = cognito_client.admin_initiate_auth(
+        response = client.admin_initiate_auth(
             UserPoolId=USER_POOL_ID,
             ClientId=CLIENT_ID,
             AuthFlow='ADMIN_USER_PASSWORD_AUTH',
@@ -40,15 +167,20 @@ def get_tokens_directly_admin_auth(email, password):
         st.session_state.id_token = response['AuthenticationResult']['IdToken']
         st.session_state.access_token = response['AuthenticationResult']['AccessToken']
         st.session_state.refresh_token = response['AuthenticationResult']['RefreshToken']
+        st.session_state.token_manager = TokenManager(
+            st.session_state.id_token,
+            st.session_state.access_token,
+            st.session_state.refresh_token
+        )
 
         st.success("Authentication successful.")
         return True
 
-    except cognito_client.exceptions.NotAuthorizedException:
+    except client.exceptions.NotAuthorizedException:
         st.error("Incorrect username or password.")
         return False
 
-    except cognito_client.exceptions.UserNotFoundException:
+    except client.exceptions.UserNotFoundException:
         st.error("User does not exist.")
         return False
 
@@ -58,42 +190,43 @@ def get_tokens_directly_admin_auth(email, password):
     
 
 
-def refresh_tokens_if_needed():
+def _token_manager():
+    """
+    Returns this session's TokenManager, creating it from the session tokens if needed.
+    """
+    manager = st.session_state.get("token_manager")
+    if manager is None:
+        manager = TokenManager(
+            st.session_state.id_token,
+            st.session_state.get("access_token"),
+            st.session_state.refresh_token
+        )
+        st.session_state.token_manager = manager
+    return manager
+
+
+def refresh_tokens_if_needed(force=False):
     """
     Refresh id_token and access_token automatically using the refresh_token.
-    Silently refresh without bothering the user.
+    Silently refresh without bothering the user: refreshes run in the background ahead
+    of expiry, so this is normally just a clock check. `force` waits for a new token
+    (e.g. after the API rejected the current one).
     """
 
     if "refresh_token" not in st.session_state or "id_token" not in st.session_state:
         return False  # No tokens available to refresh
 
     try:
-        # Decode the id_token to check expiration
-        decoded_token = jwt.get_unverified_claims(st.session_state.id_token)
-        exp_timestamp = decoded_token["exp"]
-        current_timestamp = int(time.time())
-
-        # Refresh if token expires in next 5 minutes
-        if exp_timestamp - current_timestamp < 300:
-            # Perform silent token refresh
-            response = cognito_client.admin_initiate_auth(
-                UserPoolId=USER_POOL_ID,
-                ClientId=CLIENT_ID,
-                AuthFlow='REFRESH_TOKEN_AUTH',
-                AuthParameters={
-                    'REFRESH_TOKEN': st.session_state.refresh_token
-                }
-            )
-
-            # Update session_state with new tokens
-            st.session_state.id_token = response['AuthenticationResult']['IdToken']
-            st.session_state.access_token = response['AuthenticationResult']['AccessToken']
-
-            return True
-
-        return True  # Token still valid, no need to refresh
+        manager = _token_manager()
+        with tracing.span("auth.refresh_tokens_if_needed", forced=force):
+            manager.ensure_fresh(force=force)
+
+        # Update session_state with the current tokens
+        st.session_state.id_token = manager.id_token
+        st.session_state.access_token = manager.access_token
+        st.session_state.refresh_token = manager.refresh_token
+        return True
 
     except Exception as e:
         st.error(f"Failed to refresh session: {e}")
         return False
-
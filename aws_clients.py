@@ -0,0 +1,56 @@
+# aws_clients.py
+#
+# The process's boto3 clients, created on first use and shared by every session.
+# boto3 itself is only imported then, so pages that never reach AWS (the login form,
+# the local and memory storage backends) do not pay for it. All clients come from one
+# boto3 Session, which parses the endpoint and service models once for the process.
+
+import threading
+import startup
+import tracing
+
+_SESSION = None
+_CLIENTS = {}  # {(service, config): client}
+_LOCK = threading.Lock()  # boto3 Sessions are not thread-safe while creating clients
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        with startup.imports("aws"):
+            import boto3
+        _SESSION = boto3.session.Session()
+    return _SESSION
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def client(service, **config):
+    """
+    Returns the shared boto3 client for `service` created with `config` (region_name,
+    credentials, endpoint_url, ...), creating it on the first call. Clients are thread-safe,
+    so every caller with the same configuration gets the same client.
+    """
+    key = (service, tuple(sorted(config.items())))
+    cached = _CLIENTS.get(key)
+    if cached is not None:
+        return cached
+
+    with _LOCK:
+        if key not in _CLIENTS:
+            with tracing.span("aws.client", service=service):
+                _CLIENTS[key] = _session().client(service, **config)
+        return _CLIENTS[key]
+
+
+def lazy(service, **config):
+    """
+    Returns a function that returns client(service, **config), for code that should only
+    create the client when it first talks to AWS (e.g. storage.S3Storage).
+    """
+    return lambda: client(service, **config)
@@ -0,0 +1,176 @@
+# balances.py
+
+import threading
+import pandas as pd
+import pyarrow.parquet as pq
+import transactions_store
+import tracing
+
+# Columns added to the COI table view, indexed by COI uid
+BALANCE_COLUMNS = ["token_balance", "tokens_added", "tokens_used", "n_transactions", "last_transaction"]
+
+# How per-row values and partial summaries are combined
+_AGGREGATIONS = {
+    "email_hash": "last",
+    "token_balance": "sum",
+    "tokens_added": "sum",
+    "tokens_used": "sum",
+    "n_transactions": "sum",
+    "last_transaction": "max",
+}
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _empty_summary():
+    summary = pd.DataFrame(columns=["email_hash"] + BALANCE_COLUMNS)
+    summary.index.name = "coi_id"
+    return summary
+
+
+def summarize(trans_df, date_column="timestamp"):
+    """
+    Aggregates raw transactions into one row per coi_id.
+    """
+    if trans_df.empty:
+        return _empty_summary()
+
+    tokens = trans_df["num_tokens"].fillna(0)
+    frame = pd.DataFrame({
+        "coi_id": trans_df["coi_id"],
+        "email_hash": trans_df["email_hash"] if "email_hash" in trans_df else None,
+        "token_balance": tokens,
+        "tokens_added": tokens.clip(lower=0),
+        "tokens_used": -tokens.clip(upper=0),
+        "n_transactions": 1,
+        "last_transaction": trans_df[date_column] if date_column in trans_df else pd.NaT,
+    })
+    return frame.groupby("coi_id").agg(_AGGREGATIONS)
+
+
+def combine(*summaries):
+    """
+    Merges partial summaries (e.g. old totals plus the summary of new rows).
+    """
+    summaries = [s for s in summaries if not s.empty]
+    if not summaries:
+        return _empty_summary()
+    if len(summaries) == 1:
+        return summaries[0]
+    return pd.concat(summaries).groupby(level="coi_id").agg(_AGGREGATIONS)
+
+
+# ==============================
+#  MAIN CLASS
+# ==============================
+
+class BalanceIndex:
+    """
+    Per-COI token balance and usage summary, maintained incrementally from new transactions.
+
+    For the monolithic transactions object only the row groups appended since the last
+    refresh are read (the backend appends rows; if the row count shrinks the index is
+    rebuilt). For the partitioned layout only new part files are read, and a partition is
+    re-summarized when compaction replaces its files.
+    """
+
+    def __init__(self, date_column="timestamp"):
+        self.date_column = date_column
+        self.summary = _empty_summary()
+        self.version = 0
+        self.checked_at = float("-inf")
+
+        self._lock = threading.Lock()
+        self._etag = None
+        self._rows = 0
+        self._partitions = {}  # {partition_values: (frozenset(keys), summary)}
+
+    def _read_columns(self, schema_names):
+        wanted = ["coi_id", "email_hash", "num_tokens", self.date_column]
+        return [c for c in wanted if c in schema_names]
+
+    def _publish(self, summary):
+        self.summary = summary
+        self.version += 1
+
+    def refresh_object(self, storage, key):
+        """
+        Brings the index up to date with a single transactions parquet object in `storage`.
+        """
+        with self._lock, tracing.span(f"{storage.name}.read_parquet", key=key) as attrs:
+            with storage.open(key) as f:
+                if f.etag is not None and f.etag == self._etag:
+                    attrs.update(bytes=0, rows=0)
+                    return self.summary
+
+                parquet_file = pq.ParquetFile(f, pre_buffer=True)
+                metadata = parquet_file.metadata
+                summary = self.summary
+                if metadata.num_rows < self._rows:
+                    summary, self._rows = _empty_summary(), 0  # Rows were removed -> rebuild
+
+                # Skip whole row groups already counted, then trim the partially counted one
+                start, first_group = 0, 0
+                while first_group < metadata.num_row_groups and start + metadata.row_group(first_group).num_rows <= self._rows:
+                    start += metadata.row_group(first_group).num_rows
+                    first_group += 1
+
+                new_groups = list(range(first_group, metadata.num_row_groups))
+                if new_groups:
+                    columns = self._read_columns(parquet_file.schema_arrow.names)
+                    new_rows = parquet_file.read_row_groups(new_groups, columns=columns).to_pandas()
+                    new_rows = new_rows.iloc[self._rows - start:]
+                    summary = combine(summary, summarize(new_rows, self.date_column))
+                    attrs["rows"] = len(new_rows)
+            attrs.update(bytes=getattr(f, "bytes_read", None), requests=getattr(f, "requests", None))
+
+            self._etag = f.etag
+            self._rows = metadata.num_rows
+            self._publish(summary)
+            return self.summary
+
+    def refresh_partitions(self, storage, prefix):
+        """
+        Brings the index up to date with the partitioned transactions layout in `storage`.
+        """
+        with self._lock:
+            files = transactions_store.list_files(storage, prefix)
+            changed = False
+
+            for values, keys in files.items():
+                keys = frozenset(keys)
+                seen, partition_summary = self._partitions.get(values, (frozenset(), _empty_summary()))
+                if keys == seen:
+                    continue
+
+                # New parts only -> add them; anything else (compaction) -> re-summarize the partition
+                to_read = keys - seen if seen <= keys else keys
+                if not seen <= keys:
+                    partition_summary = _empty_summary()
+
+                to_read = sorted(to_read)
+                columns = self._read_columns(storage.read_schema(to_read[0]).names) if to_read else None
+                frames = [storage.read_parquet(k, columns=columns) for k in to_read]
+                partition_summary = combine(partition_summary, *(summarize(df, self.date_column) for df in frames))
+
+                self._partitions[values] = (keys, partition_summary)
+                changed = True
+
+            for values in set(self._partitions) - set(files):
+                del self._partitions[values]
+                changed = True
+
+            if changed:
+                self._publish(combine(*(s for _, s in self._partitions.values())))
+            return self.summary
+
+    def lookup(self, coi_id):
+        """
+        Returns the balance summary of one COI as a dict (zeros if it has no transactions).
+        """
+        summary = self.summary
+        if coi_id in summary.index:
+            return summary.loc[coi_id].to_dict()
+        return {"email_hash": None, "token_balance": 0, "tokens_added": 0, "tokens_used": 0,
+                "n_transactions": 0, "last_transaction": pd.NaT}
@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+#
+# Offline benchmarks for the admin dashboard; run with `python -m benchmarks.run`.
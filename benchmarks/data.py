@@ -0,0 +1,84 @@
+# benchmarks/data.py
+#
+# Synthetic tables shaped like the production ones, generated deterministically from a seed.
+
+import hashlib
+import numpy as np
+import pandas as pd
+
+TRANSACTION_TYPES = ["Token adjustment", "Purchase", "Top up", "Redemption", "Refund"]
+FIRST_NAMES = ["Anna", "Ben", "Carla", "David", "Elena", "Frank", "Grace", "Hugo", "Iris", "Jonas"]
+LAST_NAMES = ["Smith", "Jones", "Garcia", "Miller", "Davis", "Lopez", "Wilson", "Moore", "Clark", "Lewis"]
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _email(i):
+    return f"coi{i:07d}@example.com"
+
+
+def _email_hash(email):
+    return hashlib.sha256(email.encode()).hexdigest()
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def coi_table(rows, seed=0):
+    """
+    COI table with `rows` COIs.
+    """
+    rng = np.random.default_rng(seed)
+    emails = [_email(i) for i in range(rows)]
+    return pd.DataFrame({
+        "uid": [f"{i:08x}-{seed:04x}-4000-8000-{i:012x}" for i in range(rows)],
+        "email": emails,
+        "email_hash": [_email_hash(e) for e in emails],
+        "first_name": rng.choice(FIRST_NAMES, rows),
+        "last_name": rng.choice(LAST_NAMES, rows),
+        "access_on": rng.random(rows) < 0.9,
+        "is_onboarded": rng.random(rows) < 0.7,
+    })
+
+
+def transactions_table(coi_df, rows, seed=0):
+    """
+    Transactions table with `rows` transactions spread over the COIs of `coi_df` and
+    the last two years.
+    """
+    rng = np.random.default_rng(seed + 1)
+    owners = rng.integers(0, len(coi_df), rows)
+    start = pd.Timestamp("2024-01-01").value
+    span = pd.Timedelta(days=730).value
+    return pd.DataFrame({
+        "coi_id": coi_df["uid"].to_numpy()[owners],
+        "coi_email": coi_df["email"].to_numpy()[owners],
+        "email_hash": coi_df["email_hash"].to_numpy()[owners],
+        "num_tokens": rng.integers(-20, 100, rows),
+        "transaction_type": rng.choice(TRANSACTION_TYPES, rows),
+        "timestamp": pd.to_datetime(np.sort(start + rng.integers(0, span, rows))),
+    })
+
+
+def price_table():
+    return pd.DataFrame({"qty": [1, 10, 50, 100], "price": [5.0, 45.0, 200.0, 350.0]})
+
+
+def banks_table():
+    return pd.DataFrame({"bank": ["Bank A", "Bank B", "Bank C"], "country": ["US", "US", "CA"]})
+
+
+def tables(rows, coi_rows=None, seed=0):
+    """
+    Returns {'coi', 'transactions', 'prices', 'banks'} with `rows` transactions over
+    `coi_rows` COIs (default: `rows` as well).
+    """
+    coi = coi_table(coi_rows or rows, seed)
+    return {
+        "coi": coi,
+        "transactions": transactions_table(coi, rows, seed),
+        "prices": price_table(),
+        "banks": banks_table(),
+    }
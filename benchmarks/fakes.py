@@ -0,0 +1,439 @@
+# benchmarks/fakes.py
+#
+# Local stand-ins for the AWS services the dashboard talks to:
+#
+#   LocalS3         in-memory S3 over HTTP (GET/HEAD/PUT, conditional and ranged GETs,
+#                   ListObjectsV2, DeleteObjects), reached through boto3's endpoint_url
+#   FakeGateway     the API Gateway endpoints (add-coi, delete-coi, adjust-tokens,
+#                   change-coi-data) with Lambda-like writes to LocalS3, plus Cognito's
+#                   AdminInitiateAuth and the user pool JWKS
+#
+# `python -m benchmarks.fakes --rows N` serves both, seeded with synthetic tables, from
+# their own process (so they do not count towards the app's memory) until stdin closes;
+# start_stand_ins() does that from Python.
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from xml.etree import ElementTree
+import pandas as pd
+import rsa
+from jose import jwk, jwt
+
+S3_XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+# Where the stand-ins keep the synthetic tables
+BUCKET = "eureka-bench"
+TABLE_KEYS = {
+    "coi": "coi_df.parquet",
+    "transactions": "transactions_df.parquet",
+    "prices": "default_token_prices_df.parquet",
+    "banks": "default_banks_df.parquet",
+}
+
+# The fake user pool
+REGION = "us-east-1"
+USER_POOL_ID = "us-east-1_bench"
+CLIENT_ID = "benchclient"
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}"
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            return _read_chunks(self.rfile)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding", "").startswith("aws-chunked") or \
+                self.headers.get("x-amz-content-sha256", "").startswith("STREAMING-"):
+            body = _read_chunks(io.BytesIO(body))
+        return body
+
+
+def _read_chunks(stream):
+    """
+    Decodes an HTTP/aws-chunked body ("<hex size>[;ext]\\r\\n<data>\\r\\n ... 0\\r\\n<trailers>\\r\\n").
+    """
+    data = bytearray()
+    while True:
+        size = int(stream.readline().split(b";")[0].strip() or b"0", 16)
+        if size == 0:
+            while stream.readline().strip():  # Trailers (e.g. x-amz-checksum-crc32)
+                pass
+            return bytes(data)
+        data += stream.read(size)
+        stream.readline()
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ==============================
+#  LOCAL S3
+# ==============================
+
+class LocalS3:
+    """
+    In-memory, single-region S3 stand-in served over HTTP with path-style addressing.
+    `objects` maps (bucket, key) -> (body, etag, last_modified datetime).
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.server = _serve(self._handler())
+        self.endpoint_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def put(self, bucket, key, body):
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        with self.lock:
+            self.objects[(bucket, key)] = (body, etag, datetime.now(timezone.utc))
+        return etag
+
+    def put_df(self, bucket, key, df):
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return self.put(bucket, key, buffer.getvalue())
+
+    def read_df(self, bucket, key):
+        return pd.read_parquet(io.BytesIO(self.objects[(bucket, key)][0]))
+
+    def close(self):
+        self.server.shutdown()
+
+    def _handler(self):
+        store = self
+
+        class Handler(_QuietHandler):
+            def _target(self):
+                url = urlparse(self.path)
+                bucket, _, key = url.path.lstrip("/").partition("/")
+                return unquote(bucket), unquote(key), parse_qs(url.query, keep_blank_values=True)
+
+            def _object_headers(self, etag, last_modified):
+                return {
+                    "ETag": etag,
+                    "Last-Modified": formatdate(last_modified.timestamp(), usegmt=True),
+                    "Accept-Ranges": "bytes",
+                    "Content-Type": "application/octet-stream",
+                }
+
+            def _missing(self, key):
+                body = f"<Error><Code>NoSuchKey</Code><Message>{key}</Message></Error>".encode()
+                self._send(404, body, {"Content-Type": "application/xml"})
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                store.requests += 1
+                bucket, key, query = self._target()
+                if not key:
+                    return self._list(bucket, query)
+
+                obj = store.objects.get((bucket, key))
+                if obj is None:
+                    return self._missing(key)
+                body, etag, last_modified = obj
+                headers = self._object_headers(etag, last_modified)
+
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", headers)
+                if self.headers.get("If-Match") not in (None, etag):
+                    return self._send(412, b"<Error><Code>PreconditionFailed</Code></Error>", {"Content-Type": "application/xml"})
+
+                status = 200
+                byte_range = self.headers.get("Range")
+                if byte_range:
+                    start, _, end = byte_range.split("=", 1)[1].partition("-")
+                    if start == "":
+                        start, end = max(0, len(body) - int(end)), len(body) - 1
+                    else:
+                        start, end = int(start), min(int(end) if end else len(body) - 1, len(body) - 1)
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+                    body, status = body[start:end + 1], 206
+
+                if self.command == "GET":
+                    store.bytes_sent += len(body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command == "GET":
+                    self.wfile.write(body)
+
+            def _list(self, bucket, query):
+                prefix = query.get("prefix", [""])[0]
+                with store.lock:
+                    items = sorted((k, v) for (b, k), v in store.objects.items() if b == bucket and k.startswith(prefix))
+                contents = "".join(
+                    f"<Contents><Key>{k}</Key><LastModified>{v[2].strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified>"
+                    f"<ETag>{v[1]}</ETag><Size>{len(v[0])}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+                    for k, v in items
+                )
+                body = (
+                    f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{S3_XMLNS}">'
+                    f"<Name>{bucket}</Name><Prefix>{prefix}</Prefix><KeyCount>{len(items)}</KeyCount>"
+                    f"<MaxKeys>1000</MaxKeys><IsTruncated>false</IsTruncated>{contents}</ListBucketResult>"
+                ).encode()
+                self._send(200, body, {"Content-Type": "application/xml"})
+
+            def do_PUT(self):
+                store.requests += 1
+                bucket, key, _ = self._target()
+                etag = store.put(bucket, key, self._body())
+                self._send(200, b"", {"ETag": etag})
+
+            def do_POST(self):
+                store.requests += 1
+                bucket, _, query = self._target()
+                if "delete" not in query:
+                    return self._send(400, b"<Error><Code>NotImplemented</Code></Error>")
+                root = ElementTree.fromstring(self._body())
+                deleted = []
+                for element in root.iter():
+                    if element.tag.endswith("Key"):
+                        with store.lock:
+                            store.objects.pop((bucket, element.text), None)
+                        deleted.append(f"<Deleted><Key>{element.text}</Key></Deleted>")
+                body = f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="{S3_XMLNS}">{"".join(deleted)}</DeleteResult>'
+                self._send(200, body.encode(), {"Content-Type": "application/xml"})
+
+        return Handler
+
+
+# ==============================
+#  FAKE API GATEWAY AND COGNITO
+# ==============================
+
+class FakeGateway:
+    """
+    Serves the API Gateway endpoints and the Cognito calls used by the dashboard.
+
+    Each endpoint applies its change to the tables in `s3` the way the backend Lambdas do,
+    `lambda_delay` seconds after answering (0 writes before answering). Tokens are signed
+    with a generated RSA key whose public half is served as the user pool JWKS.
+    """
+
+    def __init__(self, s3, bucket, coi_key, transactions_key, issuer, client_id,
+                 lambda_delay=0.0, token_lifetime=3600):
+        self.s3 = s3
+        self.bucket = bucket
+        self.coi_key = coi_key
+        self.transactions_key = transactions_key
+        self.issuer = issuer
+        self.client_id = client_id
+        self.lambda_delay = lambda_delay
+        self.token_lifetime = token_lifetime
+        self.calls = {}
+        self._write_lock = threading.Lock()
+
+        _, private_key = rsa.newkeys(2048)
+        self._signing_key = private_key.save_pkcs1().decode()
+        public = jwk.construct(self._signing_key, "RS256").public_key().to_dict()
+        public = {k: v.decode() if isinstance(v, bytes) else v for k, v in public.items()}
+        self.jwks = {"keys": [dict(public, kid="bench-key", use="sig")]}
+
+        self.server = _serve(self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+
+    def tokens(self):
+        """
+        Returns a fresh {IdToken, AccessToken, RefreshToken} set.
+        """
+        now = int(time.time())
+        claims = {"sub": "bench-admin", "iss": self.issuer, "iat": now, "exp": now + self.token_lifetime}
+        headers = {"kid": "bench-key"}
+        return {
+            "IdToken": jwt.encode(dict(claims, aud=self.client_id, token_use="id"), self._signing_key, "RS256", headers),
+            "AccessToken": jwt.encode(dict(claims, client_id=self.client_id, token_use="access"), self._signing_key, "RS256", headers),
+            "RefreshToken": uuid.uuid4().hex,
+            "ExpiresIn": self.token_lifetime,
+            "TokenType": "Bearer",
+        }
+
+    # --- Lambda-like table writes ---
+
+    def _update_table(self, key, change):
+        with self._write_lock:
+            df = self.s3.read_df(self.bucket, key)
+            self.s3.put_df(self.bucket, key, change(df))
+
+    def _add_coi(self, data):
+        row = {
+            "uid": uuid.uuid4().hex,
+            "email": data["email"],
+            "email_hash": hashlib.sha256(data["email"].encode()).hexdigest(),
+            "first_name": data["first_name"],
+            "last_name": data["last_name"],
+            "access_on": bool(data.get("access_on", True)),
+            "is_onboarded": bool(data.get("is_onboarded", True)),
+        }
+        self._update_table(self.coi_key, lambda df: pd.concat([df, pd.DataFrame([row])[df.columns]], ignore_index=True))
+        return {"message": "Temp-" + uuid.uuid4().hex[:8]}
+
+    def _delete_coi(self, data):
+        emails = set(data["emails"].split("\n"))
+        self._update_table(self.coi_key, lambda df: df[~df["email"].isin(emails)].reset_index(drop=True))
+        return {"message": f"Deleted {len(emails)} COI(s)"}
+
+    def _adjust_tokens(self, data):
+        row = pd.DataFrame([{
+            "coi_id": data["coi_id"],
+            "coi_email": data["coi_email"],
+            "email_hash": data["email_hash"],
+            "num_tokens": int(data["num_tokens"]),
+            "transaction_type": data["transaction_type"],
+            "timestamp": pd.Timestamp.now(),
+        }])
+
+        def append(df):
+            return pd.concat([df, row.astype(df.dtypes.to_dict())[df.columns]], ignore_index=True)
+
+        self._update_table(self.transactions_key, append)
+        return {"message": "ok"}
+
+    def _change_coi_data(self, data):
+        # Both payload formats of admin_functions.COI_CHANGES_FORMAT
+        changes = pd.DataFrame(data["rows"] if "rows" in data else [data]).set_index("uid")
+
+        def apply(df):
+            df = df.set_index("uid")
+            df.update(changes[[c for c in changes.columns if c in df.columns]])
+            return df.reset_index()
+
+        self._update_table(self.coi_key, apply)
+        return {"message": f"Updated {len(changes)} row(s)"}
+
+    # --- HTTP ---
+
+    def _handler(self):
+        gateway = self
+        routes = {
+            "/add-coi": gateway._add_coi,
+            "/delete-coi": gateway._delete_coi,
+            "/adjust-tokens": gateway._adjust_tokens,
+            "/change-coi-data": gateway._change_coi_data,
+        }
+
+        class Handler(_QuietHandler):
+            def _json(self, status, payload, content_type="application/json"):
+                self._send(status, json.dumps(payload).encode(), {"Content-Type": content_type})
+
+            def do_GET(self):
+                if self.path.endswith("jwks.json"):
+                    return self._json(200, gateway.jwks)
+                if self.path == "/stats":
+                    return self._json(200, {
+                        "s3_requests": gateway.s3.requests,
+                        "s3_bytes_sent": gateway.s3.bytes_sent,
+                        "api_calls": gateway.calls,
+                    })
+                self._json(404, {"message": "Not found"})
+
+            def do_POST(self):
+                body = json.loads(self._body() or b"{}")
+                target = self.headers.get("X-Amz-Target", "")
+                gateway.calls[target or self.path] = gateway.calls.get(target or self.path, 0) + 1
+
+                if target.endswith("AdminInitiateAuth"):
+                    tokens = gateway.tokens()
+                    if body.get("AuthFlow") == "REFRESH_TOKEN_AUTH":
+                        tokens.pop("RefreshToken")
+                    return self._json(200, {"AuthenticationResult": tokens}, "application/x-amz-json-1.1")
+
+                route = routes.get(self.path)
+                if route is None:
+                    return self._json(404, {"message": "Not found"})
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    return self._json(401, {"message": "Unauthorized"})
+
+                if gateway.lambda_delay:
+                    threading.Timer(gateway.lambda_delay, route, args=(body,)).start()
+                    return self._json(200, {"message": "Accepted"} if self.path != "/add-coi" else {"message": "Temp-pending"})
+                self._json(200, route(body))
+
+        return Handler
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def start_stand_ins(rows, coi_rows=None, lambda_delay=0.0):
+    """
+    Starts LocalS3 and FakeGateway, seeded with data.tables(rows, coi_rows), in a child
+    process. Returns (process, {'s3_url', 'gateway_url'}); close process.stdin to stop it.
+    """
+    command = [sys.executable, "-m", "benchmarks.fakes", "--rows", str(rows), "--lambda-delay", str(lambda_delay)]
+    if coi_rows:
+        command += ["--coi-rows", str(coi_rows)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, cwd=root, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError(f"stand-ins failed to start (exit code {process.wait()})")
+    return process, json.loads(line)
+
+
+def main(argv=None):
+    from benchmarks import data
+
+    parser = argparse.ArgumentParser(description="Serve the local S3 and API Gateway/Cognito stand-ins.")
+    parser.add_argument("--rows", type=int, default=1000, help="transaction table size")
+    parser.add_argument("--coi-rows", type=int, default=None, help="COI table size (default: --rows)")
+    parser.add_argument("--lambda-delay", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    s3 = LocalS3()
+    for name, df in data.tables(args.rows, args.coi_rows).items():
+        s3.put_df(BUCKET, TABLE_KEYS[name], df)
+    gateway = FakeGateway(
+        s3, BUCKET, TABLE_KEYS["coi"], TABLE_KEYS["transactions"], ISSUER, CLIENT_ID, lambda_delay=args.lambda_delay
+    )
+
+    print(json.dumps({"s3_url": s3.endpoint_url, "gateway_url": gateway.url}), flush=True)
+    sys.stdin.read()  # Serve until the parent closes stdin (or exits)
+    gateway.close()
+    s3.close()
+
+
+if __name__ == "__main__":
+    main()
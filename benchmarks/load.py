@@ -0,0 +1,419 @@
+# benchmarks/load.py
+#
+# Multi-session load test: serves dashboard-admin.py with `streamlit run` against the
+# local S3 and API Gateway/Cognito stand-ins of benchmarks/fakes.py, then drives many
+# concurrent browser-like sessions over the Streamlit websocket protocol. Each session
+# logs in and repeats a scripted admin workflow (refresh, add a COI, adjust its tokens,
+# edit it in the COI table, delete it).
+#
+#   python -m benchmarks.load                                  # 1, 2, 4 and 8 sessions
+#   python -m benchmarks.load --sessions 1 4 16 --rows 100000 --iterations 3 --output load.json
+#
+# A real server is used rather than AppTest, which swaps process-wide runtime state on
+# every run and so cannot run sessions side by side. Every session count gets a fresh
+# server and stand-ins. Reported per count: throughput, rerun latency percentiles (overall
+# and per workflow step), server CPU use and server memory per connected session.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import socket
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+import requests
+import pyarrow as pa
+from websockets.asyncio.client import connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.proto.Alert_pb2 import Alert
+from benchmarks.fakes import start_stand_ins
+from benchmarks.run import REPO_ROOT, ADMIN_EMAIL, ADMIN_PASSWORD, environment, _git_commit
+
+DEFAULT_SESSIONS = [1, 2, 4, 8]
+
+# WidgetState field the browser fills in for each widget element type
+_VALUE_FIELDS = {
+    "text_input": "string_value",
+    "text_area": "string_value",
+    "selectbox": "string_value",
+    "checkbox": "bool_value",
+    "dataframe": "string_value",  # st.data_editor: JSON editing state
+}
+
+# Statuses that end the runs triggered by one interaction (st.rerun() reports EARLY_FOR_RERUN first)
+_FINAL_STATUSES = {
+    ForwardMsg.FINISHED_SUCCESSFULLY,
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+    ForwardMsg.FINISHED_WITH_COMPILE_ERROR,
+}
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid):
+    """
+    VmRSS and VmHWM (peak) of process `pid` in MiB, from /proc (Linux).
+    """
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def _cpu_seconds(pid):
+    """
+    User plus system CPU time used by process `pid` so far (Linux).
+    """
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _percentile(values, q):
+    """
+    Nearest-rank percentile `q` (0-100) of `values`.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def start_server(env):
+    """
+    Starts dashboard-admin.py under `streamlit run` with `env` and waits until it is healthy.
+    Returns (process, websocket URL).
+    """
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "streamlit", "run", os.path.join(REPO_ROOT, "dashboard-admin.py"),
+        "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+        "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false", "--logger.level", "error",
+    ]
+    server = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit server exited with code {server.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).ok:
+                return server, f"ws://127.0.0.1:{port}/_stcore/stream"
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("streamlit server did not become healthy within 60 s")
+
+
+class Session:
+    """
+    One simulated browser tab: a websocket to the server, the elements of the page as last
+    rendered and the widget values entered so far, which are resent with every rerun the
+    way the browser does.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.websocket = None
+        self.elements = {}  # {delta_path: (element_type, proto, fragment_id, epoch)}
+        self.values = {}  # {widget_id: WidgetState}
+        self.page_script_hash = ""
+        self._epoch = 0
+
+    async def open(self):
+        self.websocket = await connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def rerun(self, fragment_id="", triggers=()):
+        """
+        Sends a rerun (of one fragment, if given) with the current widget values plus the
+        `triggers` (clicked button ids) and waits for it to finish. Returns the latency in ms.
+        """
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.page_script_hash = self.page_script_hash
+        state.fragment_id = fragment_id
+        state.widget_states.widgets.extend(self.values.values())
+        for widget_id in triggers:
+            state.widget_states.widgets.add(id=widget_id, trigger_value=True)
+
+        start = time.perf_counter()
+        await self.websocket.send(msg.SerializeToString())
+        await self._receive_run()
+        return (time.perf_counter() - start) * 1000
+
+    async def _receive_run(self):
+        fragments = set()
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.websocket.recv())
+            kind = msg.WhichOneof("type")
+
+            if kind == "new_session":
+                self._epoch += 1
+                fragments = set(msg.new_session.fragment_ids_this_run)
+                self.page_script_hash = msg.new_session.page_script_hash or self.page_script_hash
+            elif kind == "delta":
+                delta = msg.delta
+                path = tuple(msg.metadata.delta_path)
+                if delta.WhichOneof("type") == "new_element":
+                    element_type = delta.new_element.WhichOneof("type")
+                    element = getattr(delta.new_element, element_type)
+                    self.elements[path] = (element_type, element, delta.fragment_id, self._epoch)
+                elif delta.WhichOneof("type") == "add_block":
+                    self.elements[path] = ("block", None, delta.fragment_id, self._epoch)
+            elif kind == "script_finished" and msg.script_finished in _FINAL_STATUSES:
+                # Drop what the finished run did not redraw, as the browser does
+                if msg.script_finished == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    stale = [p for p, e in self.elements.items() if e[2] in fragments and e[3] < self._epoch]
+                else:
+                    stale = [p for p, e in self.elements.items() if e[3] < self._epoch]
+                for path in stale:
+                    del self.elements[path]
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("dashboard-admin.py failed to compile")
+                return
+
+    def find(self, element_type, label=None, key=None):
+        """
+        Returns (proto, fragment_id) of the first rendered `element_type` with this label
+        (or whose widget key starts with `key`).
+        """
+        for path in sorted(self.elements):
+            found_type, element, fragment_id, _ = self.elements[path]
+            if found_type != element_type:
+                continue
+            if label is not None and element.label == label:
+                return element, fragment_id
+            if key is not None and element.id.split("-", 2)[-1].startswith(key):
+                return element, fragment_id
+        raise LookupError(f"No {element_type} {label or key!r} on the page")
+
+    def set(self, element_type, label, value):
+        element, _ = self.find(element_type, label)
+        field = _VALUE_FIELDS.get(element_type)
+        if element_type == "number_input":
+            field = "int_value" if element.data_type == element.INT else "double_value"
+        self.values[element.id] = WidgetState(id=element.id, **{field: value})
+
+    async def click(self, label):
+        button, fragment_id = self.find("button", label)
+        return await self.rerun(fragment_id, triggers=[button.id])
+
+    def errors(self):
+        errors = []
+        for element_type, element, _, _ in self.elements.values():
+            if element_type == "alert" and element.format == Alert.ERROR:
+                errors.append(element.body)
+            elif element_type == "exception":
+                errors.append(f"{element.type}: {element.message}")
+        return errors
+
+
+async def _workflow(index, url, iterations, think, latencies):
+    """
+    One session: login, then `iterations` rounds of refresh, add COI, adjust its tokens,
+    edit it in the COI table and delete it. Appends (step, ms) to `latencies`.
+    """
+    session = Session(url)
+
+    async def step(name, interaction):
+        ms = await interaction
+        errors = session.errors()
+        if errors:
+            raise RuntimeError(f"session {index}: {name} failed: {errors}")
+        latencies.append((name, ms))
+        if think:
+            await asyncio.sleep(think)
+
+    try:
+        await step("open", session.open())
+        session.set("text_input", "Email", ADMIN_EMAIL)
+        session.set("text_input", "Password", ADMIN_PASSWORD)
+        await step("login", session.click("Log In"))
+
+        for i in range(iterations):
+            email = f"load-{index}-{i}@example.com"
+            await step("refresh", session.rerun())
+
+            session.set("text_input", "First Name", "Load")
+            session.set("text_input", "Last Name", f"Session{index}")
+            session.set("text_input", "Email", email)
+            await step("add_coi", session.click("Add COI"))
+
+            session.set("selectbox", "Select User", email)
+            session.set("number_input", "Adjust Token Count", 5)
+            await step("adjust_tokens", session.click("Update Tokens"))
+
+            # A cell edit reruns the table panel, which then offers to save
+            editor, fragment_id = session.find("dataframe", key="coi_editor")
+            emails = pa.ipc.open_stream(editor.arrow_data.data).read_all().column("email").to_pylist()
+            if email not in emails:
+                raise RuntimeError(f"session {index}: the added COI {email} is not in the COI table")
+            edits = {"edited_rows": {str(emails.index(email)): {"first_name": f"Edited{i}"}}, "added_rows": [], "deleted_rows": []}
+            session.values[editor.id] = WidgetState(id=editor.id, string_value=json.dumps(edits))
+            await step("edit_cells", session.rerun(fragment_id))
+            await step("save_table", session.click("💾 Save Changes to S3"))
+            session.values.pop(editor.id)  # Saving swaps in a fresh editor
+
+            session.set("text_area", "Enter emails separated by newlines", email)
+            await step("prepare_delete", session.click(":red[Prepare Deletion...]"))
+            await step("delete_coi", session.click(":red[Delete]"))
+        return session
+
+    except BaseException:
+        await session.close()
+        raise
+
+
+async def _run_sessions(url, sessions, iterations, think):
+    """
+    Runs `sessions` workflows at once. Returns (latencies, open sessions, errors, wall seconds).
+    """
+    latencies = []
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(_workflow(i, url, iterations, think, latencies) for i in range(sessions)), return_exceptions=True
+    )
+    wall = time.perf_counter() - start
+    opened = [o for o in outcomes if isinstance(o, Session)]
+    errors = [o for o in outcomes if not isinstance(o, Session)]
+    return latencies, opened, errors, wall
+
+
+async def _close_all(sessions):
+    await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
+
+
+async def _warm_up(url):
+    _, opened, errors, _ = await _run_sessions(url, 1, 0, 0)
+    await _close_all(opened)
+    if errors:
+        raise RuntimeError(f"warm-up session failed: {errors[0]}")
+
+
+def _run_level(sessions, args):
+    """
+    Measures one session count on a fresh server and fresh stand-ins. Returns the results.
+    """
+    results = []
+
+    def add(metric, value, unit):
+        results.append({"sessions": sessions, "metric": metric, "value": round(value, 6), "unit": unit})
+        print(f"  {metric:<30} {value:>14.3f} {unit}", file=sys.stderr, flush=True)
+
+    stand_ins, urls = start_stand_ins(args.rows, args.coi_rows, args.lambda_delay)
+    cache_dir = tempfile.TemporaryDirectory(prefix="eureka-load-cache-")
+    env = {**os.environ, **environment(urls, cache_dir.name, watch_interval=args.watch_interval)}
+    server = None
+    try:
+        server, url = start_server(env)
+
+        # One session warms the shared caches, so the sessions below only add their own cost
+        asyncio.run(_warm_up(url))
+        idle_rss = _proc_status(server.pid)["VmRSS"]
+        cpu_start = _cpu_seconds(server.pid)
+
+        async def measure():
+            latencies, opened, errors, wall = await _run_sessions(url, sessions, args.iterations, args.think)
+            rss = _proc_status(server.pid)  # While every session is still connected
+            await _close_all(opened)
+            return latencies, errors, wall, rss
+
+        latencies, errors, wall, rss = asyncio.run(measure())
+        cpu = _cpu_seconds(server.pid) - cpu_start
+
+        for error in errors[:3]:
+            print(f"  error: {error}", file=sys.stderr)
+        times = [ms for _, ms in latencies]
+        add("failed_sessions", len(errors), "count")
+        add("reruns", len(times), "count")
+        add("wall_time", wall, "s")
+        add("throughput", len(times) / wall if wall else 0.0, "reruns/s")
+        if times:
+            add("rerun_p50", _percentile(times, 50), "ms")
+            add("rerun_p99", _percentile(times, 99), "ms")
+            add("rerun_max", max(times), "ms")
+        for name in dict.fromkeys(name for name, _ in latencies):
+            step_times = [ms for step, ms in latencies if step == name]
+            add(f"{name}_p50", _percentile(step_times, 50), "ms")
+            add(f"{name}_p99", _percentile(step_times, 99), "ms")
+        add("server_cpu", cpu / wall if wall else 0.0, "cores")
+        add("server_rss_idle", idle_rss, "MiB")
+        add("server_rss", rss["VmRSS"], "MiB")
+        add("server_rss_peak", rss["VmHWM"], "MiB")
+        add("rss_per_session", (rss["VmRSS"] - idle_rss) / sessions, "MiB")
+
+        stats = requests.get(f"{urls['gateway_url']}/stats", timeout=10).json()
+        add("s3_requests", stats["s3_requests"], "count")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        stand_ins.stdin.close()
+        stand_ins.wait()
+        cache_dir.cleanup()
+    return results
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent multi-session load test for the admin dashboard.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS, help="concurrent session counts")
+    parser.add_argument("--iterations", type=int, default=2, help="workflow rounds per session")
+    parser.add_argument("--rows", type=int, default=10_000, help="transaction table size")
+    parser.add_argument("--coi-rows", type=int, default=1_000, help="COI table size")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each session waits between steps")
+    parser.add_argument("--watch-interval", type=float, default=15, help="server-side table watcher interval (0 disables)")
+    parser.add_argument("--lambda-delay", type=float, default=0.0,
+                        help="seconds the fake Lambdas take to write S3 after answering")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for sessions in args.sessions:
+        print(f"sessions {sessions}", file=sys.stderr, flush=True)
+        try:
+            results.extend(_run_level(sessions, args))
+        except Exception as e:
+            # Recorded rather than fatal, like a worker failure in benchmarks.run
+            print(f"  failed: {e}", file=sys.stderr)
+            results.append({"sessions": sessions, "metric": "failed", "value": 1, "unit": "count"})
+
+    report = {
+        "commit": _git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
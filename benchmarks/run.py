@@ -0,0 +1,333 @@
+# benchmarks/run.py
+#
+# Offline benchmark suite: runs admin_functions and dashboard-admin.py against the
+# local S3 and API Gateway/Cognito stand-ins of benchmarks/fakes.py, with synthetic
+# tables of each requested size. Every size runs in a fresh worker process (and the
+# stand-ins in another) so peak memory and cold-start numbers only cover the app.
+#
+#   python -m benchmarks.run                                  # 1k, 100k and 1M rows
+#   python -m benchmarks.run --sizes 1000 100000 --output before.json
+#   python -m benchmarks.run --output after.json --compare before.json
+#
+# The output is JSON: {"commit", "created", "python", "results": [{"size", "metric",
+# "value", "unit"}]}, so two runs can be compared metric by metric.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from benchmarks.fakes import BUCKET, TABLE_KEYS, REGION, USER_POOL_ID, CLIENT_ID, start_stand_ins
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+
+# The dashboard login accepted by the benchmark environment
+ADMIN_EMAIL, ADMIN_PASSWORD = "admin@example.com", "bench-password"
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KiB on Linux
+
+
+class _Recorder:
+    """
+    Emits {size, metric, value, unit} results for one worker as JSON lines on stdout as
+    soon as they are measured, so a worker that dies (e.g. out of memory) keeps its
+    earlier results.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+    def add(self, metric, value, unit):
+        result = {"size": self.size, "metric": metric, "value": round(value, 6), "unit": unit}
+        print(json.dumps(result), flush=True)
+        print(f"  {metric:<34} {value:>14.3f} {unit}", file=sys.stderr, flush=True)
+
+    def timed(self, metric, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(metric, (time.perf_counter() - start) * 1000, "ms")
+        return result
+
+
+def environment(urls, cache_dir, watch_interval=0):
+    """
+    The EUREKA_* overrides (see settings.py) pointing the app at the stand-ins started
+    by fakes.start_stand_ins.
+    """
+    gateway_url = urls["gateway_url"]
+    return {
+        "EUREKA_S3_ENDPOINT_URL": urls["s3_url"],
+        "EUREKA_S3_S3_ACCESS_KEY": "bench",
+        "EUREKA_S3_S3_SECRET_KEY": "bench",
+        "EUREKA_S3_BUCKET_NAME": BUCKET,
+        "EUREKA_S3_COI_TABLE_NAME": TABLE_KEYS["coi"],
+        "EUREKA_S3_TRANSACTIONS_TABLE_NAME": TABLE_KEYS["transactions"],
+        "EUREKA_S3_DEFAULT_TOKEN_PRICES_DF_NAME": TABLE_KEYS["prices"],
+        "EUREKA_S3_DEFAULT_BANKS_DF_NAME": TABLE_KEYS["banks"],
+        "EUREKA_S3_WATCH_INTERVAL_SECONDS": str(watch_interval),
+        "EUREKA_S3_CACHE_DIR": cache_dir,
+        "EUREKA_COGNITOCLIENT_REGION": REGION,
+        "EUREKA_COGNITOCLIENT_AWS_ACCESS_KEY_ID": "bench",
+        "EUREKA_COGNITOCLIENT_AWS_SECRET_ACCESS_KEY": "bench",
+        "EUREKA_COGNITOCLIENT_ENDPOINT_URL": gateway_url,
+        "EUREKA_COGNITO_USER_POOL_ID": USER_POOL_ID,
+        "EUREKA_COGNITO_CLIENT_ID": CLIENT_ID,
+        "EUREKA_COGNITO_JWKS_URL": f"{gateway_url}/jwks.json",
+        "EUREKA_CREDENTIALS_EMAIL": ADMIN_EMAIL,
+        "EUREKA_CREDENTIALS_PASSWORD": ADMIN_PASSWORD,
+        "EUREKA_API_ADD_COI_URL": f"{gateway_url}/add-coi",
+        "EUREKA_API_DELETE_COI_URL": f"{gateway_url}/delete-coi",
+        "EUREKA_API_ADJUST_TOKENS_URL": f"{gateway_url}/adjust-tokens",
+        "EUREKA_API_CHANGE_COI_DATA_URL": f"{gateway_url}/change-coi-data",
+        "EUREKA_API_COI_CHANGES_FORMAT": "batch",  # The fake gateway applies both formats
+        "AWS_EC2_METADATA_DISABLED": "true",
+    }
+
+
+def _button(at, label):
+    return next(button for button in at.button if button.label == label)
+
+
+def _widget(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+def _check(at, step):
+    errors = [e.value for e in at.exception] + [e.value for e in at.error]
+    if errors:
+        raise RuntimeError(f"{step} failed: {errors}")
+
+
+def _measure_decode(rec, af):
+    """
+    Parquet decode of the COI and transactions tables with default and compact dtypes.
+    """
+    from io import BytesIO
+    import pandas as pd
+    import compact_frames
+
+    for name in ("coi", "transactions"):
+        body = af.S3_CLIENT().get_object(Bucket=BUCKET, Key=TABLE_KEYS[name])["Body"].read()
+        rec.add(f"parquet_bytes_{name}", len(body), "bytes")
+        default = rec.timed(f"decode_default_{name}", pd.read_parquet, BytesIO(body))
+        compact = rec.timed(f"decode_compact_{name}", compact_frames.read_parquet, BytesIO(body),
+                            categorical=name == "transactions")
+        rec.add(f"memory_default_{name}", compact_frames.memory_bytes(default), "bytes")
+        rec.add(f"memory_compact_{name}", compact_frames.memory_bytes(compact), "bytes")
+        del default, compact
+
+
+def _measure_loads(rec, af):
+    """
+    Shared-store loads: a cold download, then a conditional-GET revalidation (304).
+    """
+    store = af.get_table_store()
+    for name in ("coi", "transactions"):
+        key = TABLE_KEYS[name]
+        df = rec.timed(f"load_cold_{name}", store.get, key)
+        rec.add(f"rows_{name}", len(df), "rows")
+        store.invalidate(key)
+        rec.timed(f"load_revalidate_{name}", store.get, key)
+    rec.timed("load_all_tables", af.load_all_tables)
+
+
+def _measure_app(rec, reruns):
+    """
+    Drives dashboard-admin.py headlessly: login, first full run, warm reruns, the
+    transactions explorer and the add/adjust/delete mutations through the real widgets.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, "dashboard-admin.py"), default_timeout=600)
+    rec.timed("app_login_form_run", at.run)
+    at.text_input[0].set_value(ADMIN_EMAIL)
+    at.text_input[1].set_value(ADMIN_PASSWORD)
+    rec.timed("app_login_and_first_run", at.button[0].click().run)
+    _check(at, "login")
+
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        times.append((time.perf_counter() - start) * 1000)
+    _check(at, "rerun")
+    rec.add("app_rerun_p50", statistics.median(times), "ms")
+    rec.add("app_rerun_max", max(times), "ms")
+
+    rec.timed("app_open_transactions", at.toggle(key="show_transactions").set_value(True).run)
+    _check(at, "transactions explorer")
+    rec.timed("app_rerun_with_transactions", at.run)
+    at.toggle(key="show_transactions").set_value(False).run()
+
+    _widget(at.text_input, "First Name").set_value("Bench")
+    _widget(at.text_input, "Last Name").set_value("Mark")
+    _widget(at.text_input, "Email").set_value("bench.new@example.com")
+    rec.timed("app_add_coi", _button(at, "Add COI").click().run)
+    _check(at, "add COI")
+    if "bench.new@example.com" not in at.session_state.coi_repo:
+        raise RuntimeError("add COI failed: the new COI is not in the repository")
+
+    _widget(at.number_input, "Adjust Token Count").set_value(5)
+    rec.timed("app_adjust_tokens", _button(at, "Update Tokens").click().run)
+    _check(at, "adjust tokens")
+
+    _widget(at.text_area, "Enter emails separated by newlines").set_value("bench.new@example.com")
+    _button(at, ":red[Prepare Deletion...]").click().run()
+    rec.timed("app_delete_coi", _button(at, ":red[Delete]").click().run)
+    _check(at, "delete COI")
+    if "bench.new@example.com" in at.session_state.coi_repo:
+        raise RuntimeError("delete COI failed: the COI is still in the repository")
+    return at
+
+
+def _measure_saves(rec, af, edits):
+    """
+    COI table save (delta upload plus one batched change-coi-data call) and a whole-table put.
+    Runs outside a script run, so it logs in to the bare-mode session state first.
+    """
+    import auth
+    import coi_repository
+
+    if not auth.get_tokens_directly_admin_auth(ADMIN_EMAIL, ADMIN_PASSWORD):
+        raise RuntimeError("login to the fake user pool failed")
+
+    coi_df = af.get_table_store().get(TABLE_KEYS["coi"])
+    edited_rows = {i: {"first_name": f"Edited{i}"} for i in range(min(edits, len(coi_df)))}
+    changes = rec.timed("save_build_changes", af.coi_row_changes, coi_df, edited_rows)
+    response = rec.timed("save_coi_changes", af.save_coi_changes, changes, coi_repository.CoiRepository(coi_df))
+    if response.status_code != 200:
+        raise RuntimeError(f"save_coi_changes failed: {response.status_code} {response.text}")
+
+    transactions = af.get_table_store().get(TABLE_KEYS["transactions"])
+    rec.timed("put_table_transactions", af.put_table, TABLE_KEYS["transactions"], transactions)
+
+
+def _worker(size, coi_rows, reruns, edits, lambda_delay):
+    """
+    Runs every measurement for one table size.
+    """
+    import requests
+    import pyarrow as pa
+    from streamlit import config, logger
+
+    config.get_option("logger.level")  # Parse the config first, or parsing resets the level
+    logger.set_log_level("error")  # Bare-mode session state and deprecation warnings
+
+    rec = _Recorder(size)
+    stand_ins, urls = start_stand_ins(size, coi_rows, lambda_delay)
+    cache_dir = tempfile.TemporaryDirectory(prefix="eureka-bench-cache-")
+    os.environ.update(environment(urls, cache_dir.name))
+
+    try:
+        start = time.perf_counter()
+        import admin_functions as af
+        import tracing
+        rec.add("import_admin_functions", (time.perf_counter() - start) * 1000, "ms")
+
+        _measure_decode(rec, af)
+        _measure_loads(rec, af)
+        _measure_app(rec, reruns)
+        _measure_saves(rec, af, edits)
+
+        stats = requests.get(f"{urls['gateway_url']}/stats", timeout=10).json()
+        rec.add("s3_requests", stats["s3_requests"], "count")
+        rec.add("s3_bytes_sent", stats["s3_bytes_sent"], "bytes")
+        for name, counter in sorted(tracing.counters().items()):
+            rec.add(f"span_total_{name}", counter["ms"], "ms")
+        rec.add("arrow_pool_peak", pa.default_memory_pool().max_memory(), "bytes")
+        rec.add("peak_rss", _peak_rss_mb(), "MiB")
+    finally:
+        stand_ins.stdin.close()
+        stand_ins.wait()
+        cache_dir.cleanup()
+
+
+def _compare(results, baseline_path):
+    """
+    Prints each metric next to the baseline run and the relative change.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["size"], r["metric"]): r["value"] for r in json.load(f)["results"]}
+    print(f"\n{'size':>9}  {'metric':<34} {'baseline':>14} {'current':>14} {'change':>8}")
+    for r in results:
+        old = baseline.get((r["size"], r["metric"]))
+        if old is None:
+            continue
+        change = f"{(r['value'] - old) / old:+.1%}" if old else ""
+        print(f"{r['size']:>9}  {r['metric']:<34} {old:>14.3f} {r['value']:>14.3f} {change:>8}")
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the admin dashboard.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="transaction table sizes (rows)")
+    parser.add_argument("--coi-rows", type=int, default=None, help="COI table size (default: same as --sizes)")
+    parser.add_argument("--reruns", type=int, default=5, help="warm reruns timed per size")
+    parser.add_argument("--edits", type=int, default=100, help="COI rows changed in the save benchmark")
+    parser.add_argument("--lambda-delay", type=float, default=0.0,
+                        help="seconds the fake Lambdas take to write S3 after answering")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="print changes against an earlier JSON results file")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        _worker(args.worker, args.coi_rows, args.reruns, args.edits, args.lambda_delay)
+        return
+
+    results = []
+    for size in args.sizes:
+        print(f"size {size}", file=sys.stderr, flush=True)
+        command = [sys.executable, "-m", "benchmarks.run", "--worker", str(size), "--reruns", str(args.reruns),
+                   "--edits", str(args.edits), "--lambda-delay", str(args.lambda_delay)]
+        if args.coi_rows:
+            command += ["--coi-rows", str(args.coi_rows)]
+        worker = subprocess.run(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True)
+        results.extend(json.loads(line) for line in worker.stdout.splitlines() if line.startswith("{"))
+        if worker.returncode != 0:
+            # Recorded rather than fatal: running out of memory at a size is a result too
+            print(f"  worker failed with exit code {worker.returncode}", file=sys.stderr)
+            results.append({"size": size, "metric": "worker_exit_code", "value": worker.returncode, "unit": "code"})
+
+    report = {
+        "commit": _git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# bulk_ops.py
+
+import json
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+
+# Bounded worker pool used for bulk API submissions
+MAX_WORKERS = 8
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+
+COI_REQUIRED_COLUMNS = ["first_name", "last_name", "email"]
+
+ADJUSTMENT_COLUMNS = ["email", "num_tokens", "transaction_type"]
+DEFAULT_TRANSACTION_TYPE = "Token adjustment"
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _add_error(errors, mask, message):
+    """
+    Appends `message` to the error text of every row selected by `mask`.
+    """
+    mask = pd.Series(mask, index=errors.index).fillna(False).astype(bool)
+    if not mask.any():
+        return
+    errors[mask] = errors[mask].str.cat([message] * int(mask.sum()), sep="; ").str.lstrip("; ")
+
+
+def _parse_price_qty(value):
+    if isinstance(value, list):
+        return value
+    records = json.loads(value)
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError("not a list of records")
+    return records
+
+
+def _to_bool(series, default):
+    """
+    Converts yes/no style spreadsheet values to booleans; blanks take `default`.
+    """
+    text = series.astype(str).str.strip().str.lower()
+    result = pd.Series(default, index=series.index)
+    result[text.isin(["true", "1", "yes", "y"])] = True
+    result[text.isin(["false", "0", "no", "n"])] = False
+    return result
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def read_upload(uploaded_file):
+    """
+    Reads an uploaded CSV or Excel (.xlsx) file into a DataFrame of strings.
+    """
+    name = uploaded_file.name.lower()
+    if name.endswith(".xlsx"):
+        return pd.read_excel(uploaded_file, dtype=str, engine="openpyxl")
+    return pd.read_csv(uploaded_file, dtype=str)
+
+
+def validate_coi_rows(df, existing_emails, default_price_qty_data):
+    """
+    Validates a bulk COI upload in one vectorised pass.
+
+    Returns (valid, invalid): `valid` holds normalised rows ready for add-coi
+    (email, first_name, last_name, initial_token_balance, price_qty_data, access_on,
+    is_onboarded); `invalid` holds the original rows plus an 'error' column.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    missing_columns = [c for c in COI_REQUIRED_COLUMNS if c not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required column(s): {', '.join(missing_columns)}")
+
+    rows = pd.DataFrame(index=df.index)
+    for column in COI_REQUIRED_COLUMNS:
+        rows[column] = df[column].astype("string").str.strip()
+    rows["email"] = rows["email"].str.lower()
+
+    errors = pd.Series("", index=df.index, dtype="string")
+    for column in COI_REQUIRED_COLUMNS:
+        _add_error(errors, rows[column].isna() | (rows[column] == ""), f"{column} is empty")
+
+    has_email = rows["email"].notna() & (rows["email"] != "")
+    _add_error(errors, has_email & ~rows["email"].str.match(EMAIL_PATTERN).fillna(False), "invalid email")
+    _add_error(errors, has_email & rows["email"].duplicated(keep=False), "duplicate email in file")
+    _add_error(errors, has_email & rows["email"].isin({e.lower() for e in existing_emails}), "email already exists")
+
+    balance = df.get("initial_token_balance", pd.Series(None, index=df.index))
+    rows["initial_token_balance"] = pd.to_numeric(balance, errors="coerce").fillna(0)
+    _add_error(errors, balance.notna() & pd.to_numeric(balance, errors="coerce").isna(), "initial_token_balance is not a number")
+    _add_error(errors, rows["initial_token_balance"] < 0, "initial_token_balance is negative")
+    rows["initial_token_balance"] = rows["initial_token_balance"].astype(int)
+
+    rows["access_on"] = _to_bool(df.get("access_on", pd.Series(None, index=df.index)), True)
+    rows["is_onboarded"] = _to_bool(df.get("is_onboarded", pd.Series(None, index=df.index)), True)
+
+    # Per-row pricing is optional; blank cells fall back to the default price/qty table
+    price_qty = pd.Series([default_price_qty_data] * len(df), index=df.index, dtype=object)
+    if "price_qty_data" in df.columns:
+        for label, value in df["price_qty_data"].dropna().items():
+            if str(value).strip():
+                try:
+                    price_qty[label] = _parse_price_qty(value)
+                except ValueError:
+                    _add_error(errors, df.index == label, "price_qty_data is not a JSON list of records")
+    rows["price_qty_data"] = price_qty
+
+    is_valid = errors == ""
+    invalid = df[~is_valid].assign(error=errors[~is_valid])
+    return rows[is_valid], invalid
+
+
+def parse_adjustment_lines(text):
+    """
+    Parses pasted "email, num_tokens[, transaction_type]" lines into a DataFrame of strings.
+    """
+    return pd.read_csv(StringIO(text), header=None, names=ADJUSTMENT_COLUMNS, dtype=str, skipinitialspace=True)
+
+
+def validate_token_adjustments(df, coi_df):
+    """
+    Resolves uid/email_hash for every adjustment with one join against the COI table.
+
+    Returns (valid, invalid): `valid` holds email, num_tokens, transaction_type, uid and
+    email_hash; `invalid` holds the original rows plus an 'error' column.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    missing_columns = [c for c in ADJUSTMENT_COLUMNS[:2] if c not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required column(s): {', '.join(missing_columns)}")
+
+    rows = pd.DataFrame(index=df.index)
+    rows["email"] = df["email"].astype("string").str.strip().str.lower()
+    tokens = pd.to_numeric(df["num_tokens"], errors="coerce")
+    rows["num_tokens"] = tokens
+
+    transaction_type = df.get("transaction_type", pd.Series(None, index=df.index)).astype("string").str.strip()
+    rows["transaction_type"] = transaction_type.mask(transaction_type.isna() | (transaction_type == ""), DEFAULT_TRANSACTION_TYPE)
+
+    # Match case-insensitively, but send the email exactly as stored in the COI table
+    coi_keys = coi_df[["email", "uid", "email_hash"]].rename(columns={"email": "coi_email"})
+    coi_keys["email"] = coi_keys["coi_email"].str.lower()
+    coi_keys["known"] = True
+    rows = rows.reset_index().merge(coi_keys.drop_duplicates("email"), on="email", how="left").set_index("index")
+    rows.index.name = None
+    rows["email"] = rows.pop("coi_email").fillna(rows["email"])
+    known = rows.pop("known").fillna(False).astype(bool)
+
+    errors = pd.Series("", index=df.index, dtype="string")
+    _add_error(errors, rows["email"].isna() | (rows["email"] == ""), "email is empty")
+    _add_error(errors, rows["email"].notna() & (rows["email"] != "") & ~known, "email not in COI table")
+    # COIs added locally get their uid/email_hash once the backend has written them
+    _add_error(errors, known & (rows["uid"].isna() | rows["email_hash"].isna()), "COI is still being created")
+    _add_error(errors, tokens.isna() | (tokens != tokens.round()), "num_tokens is not a whole number")
+    _add_error(errors, tokens == 0, "num_tokens is zero")
+
+    is_valid = errors == ""
+    valid = rows[is_valid].astype({"num_tokens": int})
+    invalid = df[~is_valid].assign(error=errors[~is_valid])
+    return valid, invalid
+
+
+def run_concurrently(items, fn, max_workers=MAX_WORKERS, progress=None):
+    """
+    Calls fn(item) for every item on a bounded thread pool and returns the results in input
+    order. An exception raised by fn is returned in place of that item's result.
+    `progress(done, total)` is called on the calling thread after each completion, so it may
+    update Streamlit elements.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        futures = {pool.submit(fn, item): i for i, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+            if progress is not None:
+                progress(done, len(items))
+    return results
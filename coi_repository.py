@@ -0,0 +1,133 @@
+# coi_repository.py
+
+import numpy as np
+import pandas as pd
+
+# Columns with a hash index
+INDEXED_COLUMNS = ("email", "uid", "email_hash")
+
+
+def _same(a, b):
+    # Missing values (None, NaN, pd.NA) are equal to each other and to nothing else
+    if pd.isna(a) or pd.isna(b):
+        return pd.isna(a) and pd.isna(b)
+    return bool(a == b)
+
+
+class CoiRepository:
+    """
+    Read-only view over one COI table snapshot with O(1) lookups by email, uid and email_hash.
+
+    A repository is built once per snapshot and shared by every dashboard section (and every
+    session in the process); `version` is the S3 ETag it was built from, so two repositories
+    can be compared without looking at their rows.
+    """
+
+    def __init__(self, df, version=None):
+        self.df = df
+        self.version = version
+        # tolist() converts arrow-backed columns in one pass instead of per element
+        self._indexes = {
+            column: dict(zip(df[column].tolist(), range(len(df))))
+            for column in INDEXED_COLUMNS
+            if column in df.columns
+        }
+        self._emails = tuple(df["email"].tolist()) if "email" in df.columns else ()
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, email):
+        return email in self._indexes.get("email", {})
+
+    @property
+    def emails(self):
+        """
+        All COI emails in table order (an immutable tuple, safe to pass to widgets).
+        """
+        return self._emails
+
+    def _get(self, column, value):
+        position = self._indexes.get(column, {}).get(value)
+        if position is None:
+            return None
+        return self.df.iloc[position].to_dict()
+
+    def by_email(self, email):
+        """
+        Returns the COI row for `email` as a dict, or None.
+        """
+        return self._get("email", email)
+
+    def by_uid(self, uid):
+        """
+        Returns the COI row for `uid` as a dict, or None.
+        """
+        return self._get("uid", uid)
+
+    def by_email_hash(self, email_hash):
+        """
+        Returns the COI row for `email_hash` as a dict, or None.
+        """
+        return self._get("email_hash", email_hash)
+
+    def missing(self, emails):
+        """
+        Returns the subset of `emails` that are not in the table, preserving order.
+        """
+        index = self._indexes.get("email", {})
+        return [email for email in emails if email not in index]
+
+    def without(self, emails):
+        """
+        Returns a new repository with the COIs for `emails` removed (this one is unchanged).
+        """
+        index = self._indexes.get("email", {})
+        drop = [index[email] for email in emails if email in index]
+        if not drop:
+            return self
+        df = self.df.drop(index=self.df.index[drop])
+        return CoiRepository(df, self.version)
+
+    def with_rows(self, rows):
+        """
+        Returns a new repository with `rows` (dicts) appended; keys that are not table
+        columns are ignored and missing columns are left empty.
+        """
+        if not rows:
+            return self
+        new_rows = pd.DataFrame.from_records(rows).reindex(columns=self.df.columns)
+        for column, dtype in self.df.dtypes.items():
+            if isinstance(dtype, np.dtype) and new_rows[column].isna().any():
+                continue  # e.g. NaN -> bool would silently become True
+            try:
+                new_rows[column] = new_rows[column].astype(dtype)  # Keep compact dtypes where possible
+            except (TypeError, ValueError):
+                pass
+        df = pd.concat([self.df, new_rows], ignore_index=True)
+        return CoiRepository(df, self.version)
+
+    def with_changes(self, changes):
+        """
+        Returns a new repository with the edited values in `changes` (a DataFrame with a
+        'uid' column) applied to the matching COIs, or this one if every matching COI already
+        has those values. Unknown uids are ignored.
+        """
+        index = self._indexes.get("uid", {})
+        columns = [c for c in changes.columns if c in self.df.columns and c != "uid"]
+        edits = []
+        for uid, (_, row) in zip(changes["uid"], changes.iterrows()):
+            position = index.get(uid)
+            if position is None:
+                continue
+            for column in columns:
+                location = self.df.columns.get_loc(column)
+                if not _same(self.df.iat[position, location], row[column]):
+                    edits.append((position, location, row[column]))
+        if not edits:
+            return self
+
+        df = self.df.copy()
+        for position, column, value in edits:
+            df.iat[position, column] = value
+        return CoiRepository(df, self.version)
@@ -0,0 +1,121 @@
+# compact_frames.py
+#
+# Compact in-memory representation for the dashboard tables:
+#
+#   strings      -> string[pyarrow] (one arrow buffer instead of a Python object per cell)
+#   low-cardinality strings (categorical tables only) -> category
+#   integers     -> smallest integer type that holds every value (downcast tables only)
+#   floats       -> float32 when that is lossless (downcast tables only)
+#
+# Edited tables are read with downcast=False: an int8 column would wrap or reject new values.
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+ARROW_STRING = pd.StringDtype("pyarrow")
+
+# A string column becomes categorical when it has at most this share of distinct values
+MAX_CATEGORY_RATIO = 0.5
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _types_mapper(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return ARROW_STRING
+    return None
+
+
+def _low_cardinality(column, max_ratio):
+    """
+    True if an arrow string column repeats its values enough to be worth a dictionary.
+    """
+    if len(column) == 0:
+        return False
+    return pc.count_distinct(column).as_py() <= max_ratio * len(column)
+
+
+def _downcast_numbers(df):
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_bool_dtype(series) or not isinstance(series.dtype, np.dtype):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[name] = pd.to_numeric(series, downcast="signed")  # Never unsigned: differences must not wrap
+        elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+            narrow = series.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(np.float64), series.to_numpy(), equal_nan=True):
+                df[name] = narrow
+    return df
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def from_arrow(table, categorical=False, max_category_ratio=MAX_CATEGORY_RATIO, downcast=True):
+    """
+    Converts an arrow table straight to a compact DataFrame, without ever building
+    Python string objects. `categorical` enables categories for low-cardinality string
+    columns; leave it off for tables edited in st.data_editor (a category column only
+    accepts existing values there).
+    """
+    if categorical:
+        for i, field in enumerate(table.schema):
+            if _types_mapper(field.type) and _low_cardinality(table.column(i), max_category_ratio):
+                table = table.set_column(i, field.name, pc.dictionary_encode(table.column(i)))
+
+    df = table.to_pandas(types_mapper=_types_mapper, self_destruct=True, split_blocks=True)
+    return _downcast_numbers(df) if downcast else df
+
+
+def compact_frame(df, categorical=False, max_category_ratio=MAX_CATEGORY_RATIO, downcast=True):
+    """
+    Returns a compact copy of an already decoded DataFrame (see from_arrow).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return from_arrow(table, categorical, max_category_ratio, downcast)
+
+
+def read_parquet(source, categorical=False, max_category_ratio=MAX_CATEGORY_RATIO, downcast=True):
+    """
+    Reads a local parquet file (memory-mapped) or an arrow buffer into a compact DataFrame.
+    """
+    table = pq.read_table(source, memory_map=True)
+    return from_arrow(table, categorical, max_category_ratio, downcast)
+
+
+def memory_bytes(df):
+    """
+    Deep memory footprint of a DataFrame in bytes (Python string objects included).
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(source, categorical=False, downcast=True):
+    """
+    Decodes a local parquet file (or an arrow buffer) both ways and returns the rows and
+    the default and compact footprints in bytes, for measuring the saving on a real table.
+    """
+    default = pd.read_parquet(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return compare(default, read_parquet(source, categorical=categorical, downcast=downcast))
+
+
+def compare(default, compact):
+    """
+    Returns the rows and the footprints of the same table decoded with default and with
+    compact dtypes, and the saving (see memory_report).
+    """
+    default_bytes, compact_bytes = memory_bytes(default), memory_bytes(compact)
+    return {
+        "rows": len(default),
+        "default_bytes": default_bytes,
+        "compact_bytes": compact_bytes,
+        "saving": 1 - compact_bytes / default_bytes if default_bytes else 0.0,
+    }
@@ -1,12 +1,12 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from time import sleep
 import json
+import time
 import uuid
-import login
-import auth
-import admin_functions as af
+import startup  # Import-time breakdown of the cold start
+
+with startup.imports("login"):
+    import login
+    import auth
 
 # Page config
 st.set_page_config(page_title="Admin Dashboard", layout="wide")
@@ -14,14 +14,24 @@ st.set_page_config(page_title="Admin Dashboard", layout="wide")
 # Handle login
 login.handle_auth()
 
+# The dashboard's dependencies load on the first signed-in run, so a new process can
+# render the login form without them
+with startup.imports("dataframes"):
+    import pandas as pd
+    import pyarrow  # Counted here rather than in the dashboard's modules, which all use it
+with startup.imports("dashboard"):
+    import admin_functions as af
+    import balances
+    import bulk_ops
+
+# Collect this rerun's hot-path spans (S3, parquet, Cognito, API Gateway)
+trace = af.start_trace()
+
 # Refresh tokens if authenticated
 if st.session_state.get("authenticated", False):
     auth.refresh_tokens_if_needed()
 
 
-
-s3_client = af.S3_CLIENT
-
 # Load logo
 logo = af.load_logo()
 st.markdown(f"""
@@ -49,10 +59,14 @@ if "counter" not in st.session_state:
     st.session_state.counter = 0
 
 
-# Load default price/qty data ONCE
-if "default_price_qty_data" not in st.session_state:
-    st.session_state.default_price_qty_data = af.load_default_price_data(counter=st.session_state.counter)
-# Editable working copy
+# Load all tables concurrently on the first run of a session
+if "coi_repo" not in st.session_state:
+    tables = af.load_all_tables()
+    st.session_state.default_price_qty_data = tables["price_qty_data"]
+    st.session_state.coi_repo = af.load_coi_repository(tables["coi_df"])
+    st.session_state.default_banks_df = tables["banks_df"]
+
+# Editable working copy of the default price/qty data
 if "price_qty_data" not in st.session_state:
     st.session_state.price_qty_data = st.session_state.default_price_qty_data.copy()
 
@@ -69,6 +83,10 @@ if "discard_changes" not in st.session_state:
 if "editor_key" not in st.session_state:
     st.session_state.editor_key = "coi_editor"
 
+# Suffix of the batch adjustment input keys; bumped after a send to clear the inputs
+if "batch_adjust_counter" not in st.session_state:
+    st.session_state.batch_adjust_counter = 0
+
 # Initialize session state variables if they don't exist
 if 'confirm_delete' not in st.session_state:
     st.session_state.confirm_delete = False
@@ -86,27 +104,25 @@ if 'update_defaults' not in st.session_state:
 #=======================================================================================================================================
 # LOAD DATA
 #=======================================================================================================================================
-# Load COI table once into session state
-if "coi_df" not in st.session_state:
-    st.session_state.coi_df = af.load_coi_table(counter = st.session_state.counter)
+# Pick up COI table versions reconciled in the background, unless the editor holds
+# unsaved edits (they are keyed by row position)
+if not af.editor_changes(st.session_state.editor_key)["has_changes"]:
+    af.sync_coi_repository()
 
-# Load transactions table
-trans_df = af.load_transactions_df(counter=st.session_state.counter)
-
-if "default_banks_df" not in st.session_state:
-    st.session_state.default_banks_df = af.load_default_banks_df(counter=st.session_state.counter)
+# Same for the default price and banks tables
+af.sync_default_tables()
 
 
 #=======================================================================================================================================
-# REFRESH COI_DF AND TRANS_DF
+# KEEP COI_DF AND TRANS_DF FRESH
 #=======================================================================================================================================
 
+# One watcher per process checks S3 for new table versions in the background
+af.get_table_watcher()
+
+# Manual fallback, e.g. with the watcher off (WATCH_INTERVAL_SECONDS = 0) or after a failed load
 if st.sidebar.button("Refresh"):
-    af.increment_counter()
-    af.load_coi_table.clear()
-    st.session_state.coi_df = af.load_coi_table(counter=st.session_state.counter)
-    trans_df = af.load_transactions_df(counter=st.session_state.counter)
-    st.rerun()
+    af.reload(coi_df=True, trans_df=True, defaults=True)
 
 
 
@@ -124,13 +140,17 @@ if st.session_state.discard_price_qty_changes:
 #  ADJUST DEFAULT SETTINGS
 #=================================================================================
 
-with st.sidebar.expander("Adjust default settings"):
+# Each panel below is a fragment: its widgets rerun only that panel. Actions that change
+# data shown by other panels (COI table, default pricing) still rerun the whole app.
 
+@st.fragment
+@af.traced_fragment
+def default_settings_panel():
 
     if "price_qty_data" not in st.session_state:
-        st.session_state.price_qty_data = af.load_default_price_data(counter=st.session_state.counter)
+        st.session_state.price_qty_data = af.load_default_price_data()
     if "default_banks_df" not in st.session_state:
-        st.session_state.default_banks_df = af.load_default_banks_df(counter=st.session_state.counter)
+        st.session_state.default_banks_df = af.load_default_banks_df()
 
     # Backup copies
     if "initial_price_qty_data" not in st.session_state:
@@ -152,7 +172,7 @@ with st.sidebar.expander("Adjust default settings"):
         st.session_state.editor_keys["banks"] = str(uuid.uuid4())
         st.rerun()
 
-    with st.sidebar.expander("Adjust default settings"):
+    with st.expander("Adjust default settings"):
 
         price_qty_df_default = st.data_editor(
             pd.DataFrame(st.session_state.price_qty_data),
@@ -173,9 +193,9 @@ with st.sidebar.expander("Adjust default settings"):
         
             
         payload = {}
-        if not price_qty_df_default.equals(pd.DataFrame(st.session_state.price_qty_data)):
+        if af.editor_changes(st.session_state.editor_keys["price"])["has_changes"]:
             payload["price_qty_data"] = price_qty_df_default.to_dict(orient="records")
-        if not banks_df_default.equals(pd.DataFrame(st.session_state.default_banks_df)):
+        if af.editor_changes(st.session_state.editor_keys["banks"])["has_changes"]:
             payload["banks_df"] = banks_df_default.to_dict(orient="records")
             
         if payload:
@@ -204,309 +224,524 @@ with st.sidebar.expander("Adjust default settings"):
 
 
 
+                    # Written tables become the shared snapshots directly: no reload needed
                     if "price_qty_data" in payload:
-                        buffer = BytesIO()
-                        pd.DataFrame(payload["price_qty_data"]).to_parquet(buffer, index=False)
-                        buffer.seek(0)
                         st.session_state.price_qty_data = payload["price_qty_data"]
-                        s3_client.put_object(
-                            Bucket=af.BUCKET_NAME,
-                            Key = af.DEFAULT_TOKEN_PRICES_DF_NAME,
-                            Body=buffer.getvalue()
-                        )
+                        af.put_table(af.DEFAULT_TOKEN_PRICES_DF_NAME, pd.DataFrame(payload["price_qty_data"]))
                     if "banks_df" in payload:
-                        buffer = BytesIO()
-                        pd.DataFrame(payload["banks_df"]).to_parquet(buffer, index=False)
-                        buffer.seek(0)
                         st.session_state.default_banks_df = payload["banks_df"]
-                        s3_client.put_object(
-                            Bucket=af.BUCKET_NAME,
-                            Key = af.DEFAULT_BANKS_DF_NAME,
-                            Body=buffer.getvalue()
-                        )
+                        af.put_table(af.DEFAULT_BANKS_DF_NAME, pd.DataFrame(payload["banks_df"]))
                     st.session_state.update_default_settings = False
-                    sleep(3)
                     st.success("Updated")
-                    st.rerun()
+                    st.rerun()  # The add-COI pricing uses these defaults
 
 
 
         with col2:
                     if st.button("Cancel Update"):
-                        reset_to_initial()
                         st.session_state.update_default_settings = False            
-                        st.rerun()
-
-
-
+                        reset_to_initial()
 
 
+with st.sidebar:
+    default_settings_panel()
 
+with st.sidebar.expander("Table memory"):
+    # Decodes each cached table twice, so only on request
+    if st.button("Measure table memory", key="measure_table_memory"):
+        st.dataframe(af.table_memory_report(), hide_index=True)
 
 
 #=================================================================================
 #  ADJUST COI TOKENS
 #=================================================================================
 
+@st.fragment
+@af.traced_fragment
+def adjust_tokens_panel():
+
+    with st.expander("expand to adjust COI tokens"):
+        with st.form("edit_tokens"):
+            email = st.selectbox("Select User", st.session_state.coi_repo.emails, key="edit_tokens_user")
+            num_tokens = st.number_input("Adjust Token Count", value=0)
+            if st.form_submit_button("Update Tokens"):
+                coi_row = st.session_state.coi_repo.by_email(email)
+                email_hash = coi_row['email_hash']
+                coi_id = coi_row['uid']
+                if pd.isna(coi_id) or pd.isna(email_hash):
+                    # Added locally; the backend has not written its uid/email_hash yet
+                    st.warning(f"{email} is still being created. Refresh and try again in a moment.")
+                else:
+                    r = af.adjust_tokens(email, email_hash, coi_id, num_tokens)
+                    st.write(r)
+
+    with st.expander("expand to adjust tokens in batch"):
+        st.caption(
+            "One adjustment per line as `email, num_tokens[, transaction_type]`, or upload a CSV/Excel "
+            "with those columns. Tick the top-up box to give every COI the same number of tokens."
+        )
+        # Fresh inputs after every send, so the same batch cannot be sent twice
+        batch = st.session_state.batch_adjust_counter
+        top_up_all = st.checkbox("Top up every COI", key=f"batch_top_up_all_{batch}")
+
+        adjustments = None
+        if top_up_all:
+            top_up_tokens = st.number_input("Tokens per COI", value=0, key=f"batch_top_up_tokens_{batch}")
+            top_up_type = st.text_input("Transaction type", value=bulk_ops.DEFAULT_TRANSACTION_TYPE, key=f"batch_top_up_type_{batch}")
+            if top_up_tokens:
+                adjustments = pd.DataFrame({
+                    "email": st.session_state.coi_repo.emails,
+                    "num_tokens": top_up_tokens,
+                    "transaction_type": top_up_type
+                })
+        else:
+            adjustment_text = st.text_area("Adjustments", placeholder="email1@example.com, 10\nemail2@example.com, -5, Refund", key=f"batch_adjust_text_{batch}")
+            adjustment_file = st.file_uploader("...or upload a file", type=["csv", "xlsx"], key=f"batch_adjust_file_{batch}")
+            try:
+                if adjustment_file is not None:
+                    adjustments = bulk_ops.read_upload(adjustment_file)
+                elif adjustment_text.strip():
+                    adjustments = bulk_ops.parse_adjustment_lines(adjustment_text)
+            except Exception as e:
+                st.error(f"Could not read adjustments: {e}")
+
+        if adjustments is not None:
+            try:
+                valid_adjustments, invalid_adjustments = bulk_ops.validate_token_adjustments(
+                    adjustments, st.session_state.coi_repo.df
+                )
+            except Exception as e:
+                st.error(f"Invalid adjustments: {e}")
+            else:
+                st.write(f"{len(valid_adjustments)} valid adjustment(s), {len(invalid_adjustments)} with errors")
+                if not invalid_adjustments.empty:
+                    st.dataframe(invalid_adjustments, hide_index=True)
+
+                if len(valid_adjustments) and st.button(f"Send {len(valid_adjustments)} adjustment(s)", key="batch_adjust_button"):
+                    progress_bar = st.progress(0.0, text="Sending...")
+                    st.session_state.batch_adjust_results = af.batch_adjust_tokens(
+                        valid_adjustments,
+                        progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} sent")
+                    )
+                    st.session_state.batch_adjust_counter += 1
+                    af.rerun_panel()
+
+        if "batch_adjust_results" in st.session_state:
+            results = st.session_state.batch_adjust_results
+            n_ok = int((results["status"] == "ok").sum())
+            st.success(f"{n_ok} of {len(results)} adjustment(s) applied.")
+            st.dataframe(results, hide_index=True)
+
 
 col1, col2 = st.columns(2)
 col1.subheader(":blue[Adjust COI tokens]")
-
-with col1.expander("expand to adjust COI tokens"):
-    with st.form("edit_tokens"):
-        email = st.selectbox("Select User", st.session_state.coi_df["email"], key="edit_tokens_user")
-        num_tokens = st.number_input("Adjust Token Count", value=0)
-        if st.form_submit_button("Update Tokens"):
-            email_hash = st.session_state.coi_df.query("email==@email")['email_hash'].tolist()[0]
-            coi_id = st.session_state.coi_df.query("email==@email")['uid'].tolist()[0]
-            payload={
-            'action': 'update transactions_df.parquet',
-            'coi_email': email,
-            'email_hash': email_hash,
-            'coi_id':coi_id,
-            'num_tokens': num_tokens,
-            'transaction_type': "Token adjustment"
-            }
-            api_url = "https://kbeopzaocc.execute-api.us-east-1.amazonaws.com/prod/adjust-tokens"
-            r = af.safe_api_post(api_url, payload)
-            st.write(r)
+with col1:
+    adjust_tokens_panel()
         
 #=================================================================================
 #  ADD NEW COI
 #=================================================================================
 
-coi_cols1, coi_cols2 = st.columns(2)
-coi_cols1.subheader(":blue[Add New COI]")
-with coi_cols1.expander("➕ expand to add a new COI"):
-
-    # === FORM ===
-    with st.form("add_coi"):
-        first_name = st.text_input("First Name", value=None)
-        last_name = st.text_input("Last Name", value=None)
-        email = st.text_input("Email", value=None)
-        initial_token_balance = st.number_input("Initial Token Balance", min_value=0)
-        access_on = st.toggle("Access On", value=True)
-        is_onboarded = st.toggle("Is Onboarded", value=True)
-        st.markdown("#### Token Pricing")
-
-        # Editable price/qty table
-        price_qty_df = st.data_editor(
-            pd.DataFrame(st.session_state.price_qty_data),
-            num_rows="dynamic",
-            use_container_width=True,
-            hide_index=True,
-            key=st.session_state.price_qty_editor_key
-        )
-
-        # Update working copy
-        st.session_state.price_qty_data = price_qty_df.to_dict(orient="records")
-
-        submitted = st.form_submit_button("Add COI")
-
-        if submitted:
-            if any(value is None for value in [first_name, last_name, email]):
-                st.error("Email and First/Last Name cannot be empty.")
-                st.stop()
-
-            # API Call to add COI
-            response = af.add_new_coi(
-                first_name,
-                last_name,
-                email,
-                initial_token_balance,
-                st.session_state.price_qty_data,
-                access_on,
-                is_onboarded
+@st.fragment
+@af.traced_fragment
+def add_coi_panel():
+
+    with st.expander("➕ expand to add a new COI"):
+
+        # Result of the last add, kept across the rerun that refreshes the other panels
+        if "add_coi_password" in st.session_state:
+            temp_password = st.session_state.add_coi_password
+            st.success("COI added successfully!")
+            st.write(f"Please write down user's temporary password: {temp_password}")
+            st.badge(temp_password, color="green")
+
+        # === FORM ===
+        with st.form("add_coi"):
+            first_name = st.text_input("First Name", value=None)
+            last_name = st.text_input("Last Name", value=None)
+            email = st.text_input("Email", value=None)
+            initial_token_balance = st.number_input("Initial Token Balance", min_value=0)
+            access_on = st.toggle("Access On", value=True)
+            is_onboarded = st.toggle("Is Onboarded", value=True)
+            st.markdown("#### Token Pricing")
+
+            # Editable price/qty table
+            price_qty_df = st.data_editor(
+                pd.DataFrame(st.session_state.price_qty_data),
+                num_rows="dynamic",
+                use_container_width=True,
+                hide_index=True,
+                key=st.session_state.price_qty_editor_key
             )
 
-            
+            # Update working copy
+            st.session_state.price_qty_data = price_qty_df.to_dict(orient="records")
 
-            if response.status_code == 200:
-                st.success("COI added successfully!")
-                temp_password = json.loads(response.text)['message']
-                st.write(f"Please write down user's temporary password: {temp_password}")
-                st.badge(temp_password, color="green")
+            submitted = st.form_submit_button("Add COI")
 
-                # ✅ 1. Reset price_qty_data to default after adding new COI
-                st.session_state.price_qty_data = st.session_state.default_price_qty_data.copy()
-                # ✅ 2. Now increment counter
-                af.increment_counter()
-                # ✅ 3. Reload updated COI table
-                af.load_coi_table.clear()
-                st.session_state.coi_df = af.load_coi_table(counter=st.session_state.counter)
-                # sleep(2)
-                # st.rerun()
-            else:
-                st.error(f"Error adding COI: {response.text}")
+            if submitted:
+                st.session_state.pop("add_coi_password", None)
+                if any(value is None for value in [first_name, last_name, email]):
+                    st.error("Email and First/Last Name cannot be empty.")
+                    return
+
+                # API Call to add COI
+                response = af.add_new_coi(
+                    first_name,
+                    last_name,
+                    email,
+                    initial_token_balance,
+                    st.session_state.price_qty_data,
+                    access_on,
+                    is_onboarded
+                )
+
+                
+
+                if response.status_code == 200:
+                    st.session_state.add_coi_password = json.loads(response.text)['message']
+
+                    # ✅ 1. Reset price_qty_data to default after adding new COI
+                    st.session_state.price_qty_data = st.session_state.default_price_qty_data.copy()
+                    # ✅ 2. Now increment counter
+                    af.increment_counter()
+                    # ✅ 3. Add the new COI to the table locally; S3 is reconciled in the background
+                    af.apply_added_cois([{
+                        "email": email,
+                        "first_name": first_name,
+                        "last_name": last_name,
+                        "initial_token_balance": initial_token_balance,
+                        "access_on": access_on,
+                        "is_onboarded": is_onboarded,
+                    }])
+                    # The new COI must show up in the other panels too
+                    st.rerun()
+                else:
+                    st.error(f"Error adding COI: {response.text}")
 
-    # --- OUTSIDE form: Discard Price/Qty Changes ---
-    st.markdown("---")
+        # --- OUTSIDE form: Discard Price/Qty Changes ---
+        st.markdown("---")
 
-    changes_made_price_qty = not price_qty_df.equals(pd.DataFrame(st.session_state.default_price_qty_data))
+        # Compared with the defaults rather than read from the editor: the working copy is fed
+        # back into the editor each run, which resets the editor's own record of the edits
+        changes_made_price_qty = af.price_qty_changed()
 
-    if changes_made_price_qty:
-        if st.button("❌ Discard Price/Qty Changes"):
-            st.session_state.discard_price_qty_changes = True
-            af.increment_counter()
-            st.rerun()
+        if changes_made_price_qty:
+            if st.button("❌ Discard Price/Qty Changes"):
+                st.session_state.discard_price_qty_changes = True
+                af.increment_counter()
+                st.rerun()
 
+    #=================================================================================
+    #  BULK IMPORT COIs
+    #=================================================================================
 
+    with st.expander("📥 expand to bulk import COIs"):
+        st.caption(
+            "CSV or Excel with columns first_name, last_name, email and optionally "
+            "initial_token_balance, access_on, is_onboarded and price_qty_data "
+            "(JSON list of price/qty records; blank uses the default pricing)."
+        )
+        upload = st.file_uploader("COI file", type=["csv", "xlsx"], key="bulk_coi_file")
+
+        if upload is not None:
+            try:
+                valid_rows, invalid_rows = bulk_ops.validate_coi_rows(
+                    bulk_ops.read_upload(upload),
+                    st.session_state.coi_repo.emails,
+                    st.session_state.default_price_qty_data
+                )
+            except Exception as e:
+                st.error(f"Could not read file: {e}")
+            else:
+                st.write(f"{len(valid_rows)} valid row(s), {len(invalid_rows)} row(s) with errors")
+                if not invalid_rows.empty:
+                    st.dataframe(invalid_rows, hide_index=True)
+
+                if len(valid_rows) and st.button(f"Add {len(valid_rows)} COI(s)", key="bulk_add_button"):
+                    progress_bar = st.progress(0.0, text="Submitting...")
+                    st.session_state.bulk_add_results = af.bulk_add_cois(
+                        valid_rows,
+                        progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} submitted")
+                    )
+                    st.rerun()  # Show the new COIs in the other panels
+
+        if "bulk_add_results" in st.session_state:
+            results = st.session_state.bulk_add_results
+            n_added = int((results["status"] == "added").sum())
+            st.success(f"{n_added} of {len(results)} COI(s) added. Download the results to keep the temporary passwords.")
+            st.dataframe(results, hide_index=True)
+            st.download_button(
+                "Download results",
+                results.to_csv(index=False),
+                file_name="coi_import_results.csv",
+                mime="text/csv"
+            )
 
-if st.session_state.discard_changes:
-    st.session_state.editor_key = f"coi_editor_{st.session_state.counter}"
-    st.session_state.discard_changes = False
+
+coi_cols1, coi_cols2 = st.columns(2)
+coi_cols1.subheader(":blue[Add New COI]")
+with coi_cols1:
+    add_coi_panel()
 
 #=================================================================================
 #  DELETE COI
 #=================================================================================
 
-coi_cols2.subheader(":red[Delete COI]")
-with coi_cols2.expander("🗑️ expand to delete COI"):
-    
+@st.fragment
+@af.traced_fragment
+def delete_coi_panel():
+
+    with st.expander("🗑️ expand to delete COI"):
+        
 
 
-    # --- Confirmation Section (Displayed only when confirmation is pending) ---
-    if st.session_state.confirm_delete:
-        st.warning(f"**Confirm Deletion:** Are you sure you want to delete COIs for the following {len(st.session_state.emails_to_delete)} email(s)? This action cannot be undone.")
+        # --- Confirmation Section (Displayed only when confirmation is pending) ---
+        if st.session_state.confirm_delete:
+            st.warning(f"**Confirm Deletion:** Are you sure you want to delete COIs for the following {len(st.session_state.emails_to_delete)} email(s)? This action cannot be undone.")
 
-        # Display the emails again for clarity during confirmation
-        st.text_area("Emails targeted for deletion:", value="\n".join(st.session_state.emails_to_delete), height=150, disabled=True)
+            # Flag emails that are not in the COI table (O(1) lookups in the shared repository)
+            unknown_emails = st.session_state.coi_repo.missing(st.session_state.emails_to_delete)
+            if unknown_emails:
+                st.info(f"{len(unknown_emails)} email(s) not found in the COI table: {', '.join(unknown_emails)}")
 
-        # Create columns for confirmation buttons
-        col1, col2, col3 = st.columns([3, 2, 3]) # Adjust ratios as needed
+            # Display the emails again for clarity during confirmation
+            st.text_area("Emails targeted for deletion:", value="\n".join(st.session_state.emails_to_delete), height=150, disabled=True)
 
-        with col1:
-            if st.button(":red[Delete]", type="primary"):
-                try:
-                    # Retrieve the list from session state
-                    email_list = st.session_state.emails_to_delete
+            # Create columns for confirmation buttons
+            col1, col2, col3 = st.columns([3, 2, 3]) # Adjust ratios as needed
 
-                    # --- Perform the actual API Call ---
-                    # st.info(f"Attempting to delete COIs for: {', '.join(email_list)}") # Optional: Add for debugging
-                    response = af.delete_coi(email_list) # Use the list stored in state
+            with col1:
+                if st.button(":red[Delete]", type="primary"):
+                    try:
+                        # Retrieve the list from session state
+                        email_list = st.session_state.emails_to_delete
 
-                    if response.status_code == 200:
-                        st.success("COI(s) deleted successfully!")
-                        sleep(3)
+                        # --- Perform the actual API Calls (chunked, in parallel) ---
+                        results = af.delete_coi(email_list) # Use the list stored in state
 
-                        # ⬇️ Reload latest table from S3 immediately
-                        af.load_coi_table.clear() # Assuming this clears a cache like st.cache_data or st.cache_resource
-                        # Ensure the key used for storing df matches where you use it elsewhere
-                        st.session_state.coi_df = af.load_coi_table()
+                        # Drop the deleted rows locally instead of reloading the table from S3
+                        deleted = results.loc[results["status"] == "deleted", "email"].tolist()
+                        if deleted:
+                            af.evict_cois(deleted)
 
-                    else:
-                        st.error(f"Error deleting COI: {response.text}")
+                        # Shown after the rerun below
+                        st.session_state.delete_results = results
+
+                    except Exception as e:
+                        st.error(f"An unexpected error occurred during deletion: {e}")
 
-                except Exception as e:
-                    st.error(f"An unexpected error occurred during deletion: {e}")
+                    finally:
+                        # --- Reset state regardless of success or failure ---
+                        st.session_state.confirm_delete = False
+                        st.session_state.emails_to_delete = []
+                        st.rerun() # Rerun the app: the deleted COIs leave every panel
 
-                finally:
-                    # --- Reset state regardless of success or failure ---
+            with col3:
+                if st.button("Cancel"):
+                    st.info("Deletion cancelled.")
+                    # --- Reset state ---
                     st.session_state.confirm_delete = False
                     st.session_state.emails_to_delete = []
-                    st.rerun() # Rerun to clear the confirmation UI and show the form again
-
-        with col3:
-            if st.button("Cancel"):
-                st.info("Deletion cancelled.")
-                # --- Reset state ---
-                st.session_state.confirm_delete = False
-                st.session_state.emails_to_delete = []
-                st.rerun() # Rerun to clear the confirmation UI
-
-    # --- Original Form Section (Displayed only when NOT confirming) ---
-    # Hide the form if confirmation is pending
-    if not st.session_state.confirm_delete:
-        with st.form("delete_coi"):
-            st.subheader("Delete COI Entries") # Added a subheader for clarity
-            emails = st.text_area("Enter emails separated by newlines", placeholder="email1@example.com\nemail2@example.com")
-            submitted = st.form_submit_button(":red[Prepare Deletion...]") # Changed button text slightly
+                    af.rerun_panel() # Rerun to clear the confirmation UI
+
+        # --- Results of the last deletion ---
+        if not st.session_state.confirm_delete and "delete_results" in st.session_state:
+            results = st.session_state.delete_results
+            n_deleted = int((results["status"] == "deleted").sum())
+            if n_deleted:
+                st.success(f"{n_deleted} COI(s) deleted successfully!")
+            if n_deleted < len(results):
+                st.error(f"Error deleting {len(results) - n_deleted} COI(s):")
+                st.caption(
+                    f"Deletions are confirmed per request of up to {af.DELETE_CHUNK_SIZE} emails, so every "
+                    "email of a failed request is listed; some may still have been deleted. "
+                    "The COI table shows the outcome once the background check for new data picks up "
+                    "the stored table, or straight away with Refresh in the sidebar."
+                )
+                st.dataframe(results[results["status"] != "deleted"], hide_index=True)
+
+        # --- Original Form Section (Displayed only when NOT confirming) ---
+        # Hide the form if confirmation is pending
+        if not st.session_state.confirm_delete:
+            with st.form("delete_coi"):
+                st.subheader("Delete COI Entries") # Added a subheader for clarity
+                emails = st.text_area("Enter emails separated by newlines", placeholder="email1@example.com\nemail2@example.com")
+                submitted = st.form_submit_button(":red[Prepare Deletion...]") # Changed button text slightly
+
+                if submitted:
+                    # Basic validation
+                    if not emails.strip():
+                        st.error("Emails cannot be empty.")
+                        # No st.stop() needed here, just let the form finish without proceeding
+                    else:
+                        # Prepare list and store in session state for confirmation
+                        email_list = [email.strip() for email in emails.strip().split("\n") if email.strip()] # Clean up list
 
-            if submitted:
-                # Basic validation
-                if not emails.strip():
-                    st.error("Emails cannot be empty.")
-                    # No st.stop() needed here, just let the form finish without proceeding
-                else:
-                    # Prepare list and store in session state for confirmation
-                    email_list = [email.strip() for email in emails.strip().split("\n") if email.strip()] # Clean up list
+                        if not email_list:
+                            st.error("No valid emails entered after stripping whitespace.")
+                        else:
+                            st.session_state.emails_to_delete = email_list
+                            st.session_state.pop("delete_results", None)
+                            st.session_state.confirm_delete = True # Set flag to trigger confirmation UI
+                            af.rerun_panel() # Rerun immediately to show the confirmation section
+
+
+coi_cols2.subheader(":red[Delete COI]")
+with coi_cols2:
+    delete_coi_panel()
 
-                    if not email_list:
-                        st.error("No valid emails entered after stripping whitespace.")
-                    else:
-                        st.session_state.emails_to_delete = email_list
-                        st.session_state.confirm_delete = True # Set flag to trigger confirmation UI
-                        st.rerun() # Rerun immediately to show the confirmation section
 #=================================================================================
 #  COI TABLE
 #=================================================================================
 
-st.subheader(":blue[COI Table]")
-with st.expander("Expand to see table"):
+@st.fragment
+@af.traced_fragment
+def coi_table_panel():
 
-    edited_df = st.data_editor(
-        st.session_state.coi_df,
-        num_rows="fixed",
-        use_container_width=True,
-        key=st.session_state.editor_key
-    )
+    if st.session_state.discard_changes:
+        st.session_state.editor_key = f"coi_editor_{st.session_state.counter}"
+        st.session_state.discard_changes = False
 
-    st.session_state.changes_made_coi = not edited_df.equals(st.session_state.coi_df)
-    # changes_made_coi = not edited_df.equals(st.session_state.coi_df)
+    with st.expander("Expand to see table"):
 
-    if st.session_state.changes_made_coi:
-        col1, col2 = st.columns(2)
+        # COI table plus read-only token balance columns from the balance index
+        coi_view = af.coi_table_view(st.session_state.coi_repo.df)
 
-        with col1:
-            if st.button("💾 Save Changes to S3"):
-                try:
-                    buffer = BytesIO()
-                    edited_df.to_parquet(buffer, index=False)
-                    buffer.seek(0)
-
-                    TEMP_TABLE_NAME = "temp/temp_coi_table.parquet"
-
-                    af.S3_CLIENT.put_object(
-                        Bucket=af.BUCKET_NAME,
-                        Key=TEMP_TABLE_NAME,
-                        Body=buffer,
-                        ContentType="application/octet-stream"
-                    )
+        st.data_editor(
+            coi_view,
+            num_rows="fixed",
+            use_container_width=True,
+            disabled=balances.BALANCE_COLUMNS,
+            key=st.session_state.editor_key
+        )
 
-                    # st.session_state.coi_df = edited_df.copy()
-                    st.success("COI Table updated and saved to S3!")
-
-                    cols = ['uid','email','first_name','last_name','access_on']
-                    df = edited_df[cols].copy()
-                    df = pd.concat([st.session_state.coi_df[cols], df]).drop_duplicates(keep=False)
-                    payload = df.iloc[-1,:].to_dict()
-                    st.write(payload)
-                    api_url = "https://xuyzj7f0zd.execute-api.us-east-1.amazonaws.com/prod/change-coi-data"
-                    response = af.safe_api_post(api_url, payload)
-
-                    st.session_state.changes_made_coi = False
-                    st.session_state.changes_made_coi = False
-                    sleep(3)
-                    af.reload(coi_df=True)
- 
-                except Exception as e:
-                    st.error(f"Failed to save table: {e}")
-                
+        coi_edits = af.editor_changes(st.session_state.editor_key)
+        st.session_state.changes_made_coi = coi_edits["has_changes"]
 
+        if st.session_state.changes_made_coi:
+            st.caption(f"{len(coi_edits['edited_rows'])} edited row(s)")
+            col1, col2 = st.columns(2)
 
-        with col2:
-            if st.session_state.changes_made_coi:
+            with col1:
+                if st.button("💾 Save Changes to S3"):
+                    try:
+                        # Only the rows the editor reports as edited are sent
+                        edited_rows = st.session_state[st.session_state.editor_key]["edited_rows"]
+                        changes = af.coi_row_changes(st.session_state.coi_repo.df, edited_rows)
+                        st.write(changes)
+
+                        response = af.save_coi_changes(changes, st.session_state.coi_repo)
+
+                        if response.status_code == 200:
+                            st.success(f"Saved {len(changes)} changed COI row(s) to S3!")
+                            # Apply the edits locally; S3 is reconciled in the background
+                            af.apply_coi_changes(changes)
+
+                            st.session_state.changes_made_coi = False
+                            st.session_state.discard_changes = True  # Fresh editor for the updated table
+                            af.reload()
+                        else:
+                            # Keep the edits and the message, so the admin can retry
+                            st.error(f"Error saving COI changes: {response.text}")
+     
+                    except Exception as e:
+                        st.error(f"Failed to save table: {e}")
+                    
+
+
+            with col2:
+                if st.session_state.changes_made_coi:
+
+                    if st.button("❌ Discard COI Table Changes"):
+                        st.session_state.discard_changes = True
+                        st.session_state.counter += 1
+                        af.rerun_panel()
 
-                if st.button("❌ Discard COI Table Changes"):
-                    st.session_state.discard_changes = True
-                    st.session_state.counter += 1
-                    st.rerun()
+
+st.subheader(":blue[COI Table]")
+coi_table_panel()
 
 #=================================================================================
 #  TRANSACTIONS TABLE
 #=================================================================================
+
+@st.fragment
+@af.traced_fragment
+def transactions_panel():
+
+    with st.expander("Expand to see transactions"):
+
+        # Nothing is read from S3 until the explorer is switched on
+        if st.toggle("Load transactions", key="show_transactions"):
+            trans_options = af.transactions_filter_options()
+
+            f_col1, f_col2, f_col3 = st.columns(3)
+            coi_filter = f_col1.text_input("COI email or id", key="trans_coi_filter").strip()
+            type_filter = f_col2.multiselect("Transaction type", trans_options["transaction_types"], key="trans_type_filter")
+            date_filter = f_col3.date_input(
+                "Date range",
+                value=(),
+                disabled=trans_options["date_column"] is None,
+                key="trans_date_filter"
+            )
+
+            filters = af.transactions_filters(coi_filter, type_filter, date_filter, trans_options)
+            trans_df = af.query_transactions(filters)
+
+            # Page through the filtered result; only the current page is sent to the browser
+            p_col1, p_col2 = st.columns(2)
+            page_size = p_col1.selectbox("Rows per page", [50, 100, 500, 1000], key="trans_page_size")
+            n_pages = max(1, -(-len(trans_df) // page_size))
+            page = p_col2.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, key="trans_page")
+
+            st.caption(f"{len(trans_df)} matching transactions")
+            st.dataframe(trans_df.iloc[(page - 1) * page_size: page * page_size])
+
+
 st.subheader(":blue[Transactions]")
-with st.expander("Expand to see transactions"):
-    st.dataframe(trans_df)
+transactions_panel()
+
+#=================================================================================
+#  DATA FRESHNESS
+#=================================================================================
+
+@st.fragment(run_every=af.WATCH_INTERVAL_SECONDS or None)
+def data_freshness():
+    # Rerun the page when the watcher has loaded newer data, unless COI edits are pending
+    if af.has_newer_data() and not af.editor_changes(st.session_state.editor_key)["has_changes"]:
+        st.rerun()
+
+    watcher = af.get_table_watcher()
+    if watcher is not None and watcher.checked_at:
+        st.caption(f"Data checked for updates at {time.strftime('%H:%M:%S', time.localtime(watcher.checked_at))}")
+
+
+with st.sidebar:
+    data_freshness()
+
+trace.finish()
+
+#=================================================================================
+#  PERFORMANCE TRACE (optional, see af.TRACE_PANEL)
+#=================================================================================
+
+@st.fragment
+def trace_panel():
+    traces = list(st.session_state.traces)
+    with st.expander("Performance trace"):
+        choice = st.selectbox(
+            "Rerun", range(len(traces)), index=len(traces) - 1, key="trace_rerun",
+            format_func=lambda i: f"{time.strftime('%H:%M:%S', time.localtime(traces[i].started))} {traces[i].label}"
+        )
+        spans, counters = af.trace_tables(traces[choice])
+        st.caption(f"{traces[choice].elapsed_ms:.0f} ms rerun, {spans['ms'].sum():.0f} ms in {int(spans['count'].sum())} span(s)")
+        st.dataframe(spans, hide_index=True)
+        st.caption("Since the server started")
+        st.dataframe(counters, hide_index=True)
+        st.caption(f"Cold start imports: {startup.report()}")
 
 
+if af.TRACE_PANEL:
+    with st.sidebar:
+        trace_panel()
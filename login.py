@@ -1,5 +1,6 @@
 import streamlit as st
 import auth  # <-- we import our auth.py functions here
+import settings
 
 def handle_auth():
     """
@@ -28,8 +29,8 @@ def handle_auth():
 
             if submit_button:
                 # First check against local Streamlit secrets (optional)
-                valid_email = st.secrets["credentials"]["email"]
-                valid_password = st.secrets["credentials"]["password"]
+                valid_email = settings.get("credentials", "email")
+                valid_password = settings.get("credentials", "password")
 
                 if email_input == valid_email and password_input == valid_password:
                     # Call Cognito AdminInitiateAuth
@@ -0,0 +1,165 @@
+# s3_cache.py
+
+import os
+import json
+import shutil
+import threading
+from io import BytesIO
+import pandas as pd
+from botocore.exceptions import ClientError
+import tracing
+
+# --- Local cache location (override with EUREKA_S3_CACHE_DIR) ---
+CACHE_DIR = os.environ.get("EUREKA_S3_CACHE_DIR", ".s3_cache")
+
+# Bytes copied per read when streaming an object body to disk
+CHUNK_SIZE = 1024 * 1024
+
+# Decoded tables kept per process: {(bucket, key): (etag, DataFrame)}
+_DECODED = {}
+
+# One writer per cached object at a time, so its parquet and metadata files always match
+_WRITE_LOCKS = {}
+_WRITE_LOCKS_GUARD = threading.Lock()
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _cache_paths(bucket, key):
+    """
+    Returns the (parquet_path, metadata_path) pair used to cache an S3 object on disk.
+    """
+    safe_name = f"{bucket}__{key}".replace("/", "__")
+    data_path = os.path.join(CACHE_DIR, safe_name)
+    return data_path, data_path + ".json"
+
+
+def _read_meta(bucket, key):
+    """
+    Returns the cached ETag/VersionId metadata for a key, or None if nothing usable is cached.
+    """
+    data_path, meta_path = _cache_paths(bucket, key)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_lock(bucket, key):
+    with _WRITE_LOCKS_GUARD:
+        return _WRITE_LOCKS.setdefault((bucket, key), threading.Lock())
+
+
+def _write_cache(bucket, key, body, meta):
+    """
+    Streams the object body and writes its metadata to the local cache.
+    Files are written to a temp name first so a crash never leaves a half-written parquet;
+    the temp name is unique per writer, so processes sharing CACHE_DIR never collide.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    data_path, meta_path = _cache_paths(bucket, key)
+    suffix = f".{os.getpid()}-{threading.get_ident()}.tmp"
+
+    with _write_lock(bucket, key):
+        tmp_path = data_path + suffix
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(body, f, CHUNK_SIZE)
+        os.replace(tmp_path, data_path)
+
+        tmp_path = meta_path + suffix
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+
+def _is_not_modified(error):
+    return error.response.get("Error", {}).get("Code") in ("304", "NotModified")
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def _read_local(path):
+    return pd.read_parquet(path, memory_map=True)
+
+
+def _decode(reader, bucket, key, etag):
+    """
+    Decodes the cached parquet of a key and keeps the result as the decoded copy of `etag`.
+    """
+    data_path, _ = _cache_paths(bucket, key)
+    with tracing.span("parquet.read", key=key) as attrs:
+        df = reader(data_path)
+        attrs["rows"] = len(df)
+    _DECODED[(bucket, key)] = (etag, df)
+    return df
+
+
+def fetch(client, bucket, key, reader=None):
+    """
+    Returns (DataFrame, metadata) for the parquet object at s3://bucket/key.
+
+    The ETag of every downloaded object is remembered and sent back as If-None-Match,
+    so an unchanged object costs a single 304 round-trip and is served from the local
+    on-disk cache (or from the already decoded copy, when this process has one).
+    `reader(path)` decodes the cached file (default: pd.read_parquet, memory-mapped).
+    """
+    reader = reader or _read_local
+    meta = _read_meta(bucket, key)
+
+    kwargs = {}
+    if meta and meta.get("etag"):
+        kwargs["IfNoneMatch"] = meta["etag"]
+
+    with tracing.span("s3.get_object", key=key) as attrs:
+        try:
+            response = client.get_object(Bucket=bucket, Key=key, **kwargs)
+
+        except ClientError as e:
+            if not (meta and _is_not_modified(e)):
+                raise
+            response = None
+            attrs.update(status=304, bytes=0)
+
+        else:
+            meta = {
+                "etag": response.get("ETag"),
+                "version_id": response.get("VersionId"),
+                "last_modified": str(response.get("LastModified")),
+            }
+            # Stream straight to disk and decode from a memory map: the raw bytes never sit in memory
+            _write_cache(bucket, key, response['Body'], meta)
+            attrs.update(status=200, bytes=response.get("ContentLength"))
+
+    if response is None:
+        # Object unchanged -> reuse the decoded copy or fall back to the parquet on disk
+        cached = _DECODED.get((bucket, key))
+        if cached and cached[0] == meta["etag"]:
+            return cached[1], meta
+
+    return _decode(reader, bucket, key, meta["etag"]), meta
+
+
+def store(bucket, key, body, meta, df=None):
+    """
+    Seeds the cache with an object this process has just written itself (e.g. from the
+    put_object response), so the next conditional GET is answered with a 304.
+    """
+    _write_cache(bucket, key, BytesIO(body), meta)
+    if df is not None:
+        _DECODED[(bucket, key)] = (meta["etag"], df)
+    else:
+        _DECODED.pop((bucket, key), None)
+
+
+def cached_path(bucket, key):
+    """
+    Returns the local parquet path of a cached object, or None if it is not cached.
+    """
+    data_path, _ = _cache_paths(bucket, key)
+    return data_path if os.path.exists(data_path) else None
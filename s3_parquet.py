@@ -0,0 +1,195 @@
+# s3_parquet.py
+
+import io
+import operator
+import pandas as pd
+import pyarrow.parquet as pq
+import compact_frames
+import s3_versions
+
+# Comparison operators accepted in `filters`, as used by pd.read_parquet / pyarrow
+_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+class S3RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over one S3 object.
+    Every read is a ranged GET pinned to the object's ETag, so only the bytes the
+    parquet reader asks for (footer, then the selected column chunks) are transferred.
+    A key that does not exist, or is deleted while it is read, raises FileNotFoundError.
+    """
+
+    def __init__(self, client, bucket, key):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+
+        try:
+            head = client.head_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            self._raise_if_not_found(e)
+            raise
+        self.size = head["ContentLength"]
+        self.etag = head.get("ETag")
+
+        self.bytes_read = 0
+        self.requests = 0
+        self._pos = 0
+
+    def _raise_if_not_found(self, error):
+        if s3_versions.is_not_found(error):
+            raise FileNotFoundError(f"s3://{self.bucket}/{self.key}") from error
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._pos >= self.size or len(buffer) == 0:
+            return 0
+
+        end = min(self._pos + len(buffer), self.size) - 1
+        kwargs = {"IfMatch": self.etag} if self.etag else {}
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self.key, Range=f"bytes={self._pos}-{end}", **kwargs
+            )
+        except Exception as e:
+            self._raise_if_not_found(e)
+            raise
+        data = response['Body'].read()
+
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        self.bytes_read += len(data)
+        self.requests += 1
+        return len(data)
+
+
+def is_flat_filters(filters):
+    """
+    True for a plain AND-list of (column, op, value) tuples (not the OR-of-ANDs form).
+    """
+    return bool(filters) and all(isinstance(f, tuple) for f in filters)
+
+
+def _row_group_may_match(row_group, filters):
+    """
+    Uses the row group's min/max statistics to decide whether any row can pass `filters`.
+    Anything the statistics cannot rule out is kept.
+    """
+    columns = {row_group.column(i).path_in_schema: row_group.column(i) for i in range(row_group.num_columns)}
+
+    for column, op, value in filters:
+        chunk = columns.get(column)
+        stats = chunk.statistics if chunk is not None else None
+        if stats is None or not stats.has_min_max:
+            continue
+
+        low, high = stats.min, stats.max
+        try:
+            if op in ("==", "=") and (value < low or value > high):
+                return False
+            if op == "in" and all(v < low or v > high for v in value):
+                return False
+            if op == "<" and low >= value:
+                return False
+            if op == "<=" and low > value:
+                return False
+            if op == ">" and high <= value:
+                return False
+            if op == ">=" and high < value:
+                return False
+        except TypeError:
+            continue  # Statistics not comparable with the filter value -> keep the row group
+
+    return True
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def filter_frame(df, filters):
+    """
+    Applies pyarrow-style `filters` (AND-list, or OR-list of AND-lists) to an in-memory DataFrame.
+    """
+    if not filters:
+        return df
+
+    groups = [filters] if is_flat_filters(filters) else filters
+    mask = pd.Series(False, index=df.index)
+    for group in groups:
+        group_mask = pd.Series(True, index=df.index)
+        for column, op, value in group:
+            if op == "in":
+                group_mask &= df[column].isin(value)
+            elif op == "not in":
+                group_mask &= ~df[column].isin(value)
+            else:
+                group_mask &= _OPERATORS[op](df[column], value)
+        mask |= group_mask
+    return df[mask]
+
+
+def read_file(f, columns=None, filters=None, compact=False, categorical=False):
+    """
+    Reads only the requested `columns` of the rows matching `filters` from a seekable parquet file.
+
+    The footer is read first; row groups whose statistics cannot match `filters` are
+    skipped and only the needed column chunks of the remaining ones are read.
+    `filters` uses the pd.read_parquet format, e.g. [("email", "==", "a@b.com")].
+    `compact` decodes to arrow-backed strings and downcast numbers (see compact_frames);
+    `categorical` also turns low-cardinality string columns into categories.
+    """
+    parquet_file = pq.ParquetFile(f, pre_buffer=True)
+    metadata = parquet_file.metadata
+
+    row_groups = list(range(metadata.num_row_groups))
+    if is_flat_filters(filters):
+        row_groups = [i for i in row_groups if _row_group_may_match(metadata.row_group(i), filters)]
+
+    read_columns = None
+    if columns is not None:
+        filter_columns = [condition[0] for group in ([filters] if is_flat_filters(filters) else filters or []) for condition in group]
+        read_columns = list(dict.fromkeys(list(columns) + filter_columns))
+
+    if not row_groups:
+        table = parquet_file.schema_arrow.empty_table()
+        if read_columns is not None:
+            table = table.select(read_columns)
+    else:
+        table = parquet_file.read_row_groups(row_groups, columns=read_columns)
+
+    if filters:
+        table = table.filter(pq.filters_to_expression(filters))
+    if columns is not None:
+        table = table.select(list(columns))
+    if compact:
+        return compact_frames.from_arrow(table, categorical=categorical)
+    return table.to_pandas()
@@ -0,0 +1,74 @@
+# s3_versions.py
+
+import time
+from botocore.exceptions import ClientError
+
+# Error codes S3 answers with for a key that does not exist
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def is_not_found(error):
+    """
+    True if `error` is S3 reporting that the key does not exist.
+    """
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in NOT_FOUND_CODES
+
+
+def head_version(client, bucket, key):
+    """
+    Returns {'etag', 'version_id', 'last_modified'} for an S3 object, or None if it does not exist.
+    """
+    try:
+        response = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if is_not_found(e):
+            return None
+        raise
+    return {
+        "etag": response.get("ETag"),
+        "version_id": response.get("VersionId"),
+        "last_modified": response.get("LastModified"),
+    }
+
+
+def _is_new(version, previous_etag, expected_etag, modified_after):
+    if version is None:
+        return False
+    if expected_etag is not None:
+        return version["etag"] == expected_etag
+    if previous_etag is not None and version["etag"] != previous_etag:
+        return True
+    last_modified = version.get("last_modified")
+    return modified_after is not None and last_modified is not None and last_modified > modified_after
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def poll_version(head, previous_etag=None, expected_etag=None, modified_after=None,
+                 timeout=30, initial_interval=0.1, max_interval=2.0):
+    """
+    Calls `head()` (returning a version dict like head_version, or None) until the object
+    has been rewritten, i.e. it has `expected_etag`, or an ETag other than `previous_etag`,
+    or a LastModified later than `modified_after` (an aware datetime). Polling starts every
+    `initial_interval` seconds and backs off to `max_interval`, so fast writes are seen
+    quickly without hammering the store.
+
+    Returns the new version dict, or None if `timeout` passes first.
+    """
+    deadline = time.monotonic() + timeout
+    interval = initial_interval
+    while True:
+        version = head()
+        if _is_new(version, previous_etag, expected_etag, modified_after):
+            return version
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, max_interval)
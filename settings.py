@@ -0,0 +1,87 @@
+# settings.py
+#
+# Configuration lookup shared by the modules: a value comes from the environment
+# variable EUREKA_<SECTION>_<KEY> (e.g. EUREKA_S3_BUCKET_NAME) if set, else from
+# st.secrets[section][key], else the default. Importing a module therefore never
+# requires a secrets.toml, which lets the benchmarks run against local stand-ins.
+#
+# Environment values are strings. get() converts one to the type of the setting's default
+# when that is a bool, int, float, list or dict, so EUREKA_CREDENTIALS_PASSWORD=12345
+# stays the string "12345" while EUREKA_S3_TABLE_TTL_SECONDS=30 becomes 30.
+
+import os
+import json
+import streamlit as st
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _env_name(section, key):
+    return f"EUREKA_{section}_{key}".upper()
+
+
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+
+
+def _coerce(name, value, default):
+    """
+    Converts the environment value of `name` to the type of `default` (see module docstring).
+    """
+    try:
+        if isinstance(default, bool):
+            if value.strip().lower() not in _TRUE | _FALSE:
+                raise ValueError("expected true or false")
+            return value.strip().lower() in _TRUE
+        if isinstance(default, (int, float)):
+            try:
+                return int(value)
+            except ValueError:
+                return float(value)  # e.g. a fractional timeout whose default is a whole number
+        if isinstance(default, (list, dict)):
+            parsed = json.loads(value)
+            if not isinstance(parsed, type(default)):
+                raise ValueError(f"expected a JSON {type(default).__name__}")
+            return parsed
+    except ValueError as e:
+        raise ValueError(f"{name}={value!r}: {e}") from None
+    return value
+
+
+def _secrets_section(section):
+    try:
+        return dict(st.secrets[section])
+    except Exception:  # No secrets.toml, or no such section
+        return {}
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def get(section, key, default=None):
+    """
+    Returns the setting `key` of `section` (see module docstring).
+    """
+    name = _env_name(section, key)
+    value = os.environ.get(name)
+    if value is not None:
+        return _coerce(name, value, default)
+    return _secrets_section(section).get(key, default)
+
+
+def section(name):
+    """
+    Returns every setting of a section as a dict, environment overrides included.
+    Environment values are left as strings; use get() for settings with a typed default.
+    """
+    values = _secrets_section(name)
+    prefix = _env_name(name, "")
+    for env_name, value in os.environ.items():
+        if env_name.startswith(prefix):
+            key = env_name[len(prefix):]
+            # Keep the secrets' spelling of the key when it only differs in case
+            key = next((k for k in values if k.upper() == key), key)
+            values[key] = value
+    return values
@@ -0,0 +1,87 @@
+# startup.py
+#
+# Cold-start accounting. The page script loads its dependencies in named groups:
+#
+#   with startup.imports("dataframes"):
+#       import pandas as pd
+#
+# The first time a group actually loads modules, its wall time and module count are kept
+# for the process, recorded as an "import.<group>" span (see tracing.py) and logged as one
+# line on the "eureka.startup" logger. Groups run in order, so a module shared by two
+# groups counts toward the first one. Later reruns find the modules loaded and record nothing.
+
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import settings
+import tracing
+
+logger = logging.getLogger("eureka.startup")
+
+# Log the breakdown on stderr as the groups load
+STARTUP_REPORT = settings.get("tracing", "STARTUP_REPORT", True)
+
+# {group: {"ms", "modules"}} in load order
+_BREAKDOWN = {}
+_BREAKDOWN_LOCK = threading.Lock()
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _enable_logging():
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+if STARTUP_REPORT:
+    _enable_logging()
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+@contextmanager
+def imports(group):
+    """
+    Times the imports in the enclosed block as `group` (see module docstring).
+    """
+    loaded = len(sys.modules)
+    start = time.perf_counter()
+    yield
+    modules = len(sys.modules) - loaded
+    if modules <= 0:
+        return
+
+    ms = (time.perf_counter() - start) * 1000
+    with _BREAKDOWN_LOCK:
+        if group in _BREAKDOWN:
+            return  # Another session loaded the group at the same time
+        _BREAKDOWN[group] = {"ms": ms, "modules": modules}
+
+    tracing.record(f"import.{group}", ms, modules=modules)
+    logger.info("import %s: %.0f ms, %d modules", group, ms, modules)
+
+
+def breakdown():
+    """
+    Returns the import groups loaded so far, in load order: [{group, ms, modules}].
+    """
+    with _BREAKDOWN_LOCK:
+        return [{"group": group, **record} for group, record in _BREAKDOWN.items()]
+
+
+def report():
+    """
+    Returns a one-line summary of the breakdown, e.g. "dataframes 430 ms, app 120 ms".
+    """
+    rows = breakdown()
+    total = sum(row["ms"] for row in rows)
+    parts = ", ".join(f"{row['group']} {row['ms']:.0f} ms" for row in rows)
+    return f"{parts} ({total:.0f} ms in imports)" if rows else "no imports recorded"
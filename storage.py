@@ -0,0 +1,361 @@
+# storage.py
+#
+# Storage backends for the dashboard tables (parquet objects addressed by key):
+#
+#   S3Storage      an S3 bucket: ETag-revalidated local cache, ranged parquet reads
+#   LocalStorage   a directory, e.g. a mirror kept in sync with the bucket: memory-mapped reads
+#   MemoryStorage  a dict in this process, for offline runs, tests and profiling
+#
+# Every backend reports object versions as {'etag', 'version_id', 'last_modified'}, so
+# the snapshot store, the watcher and write reconciliation work the same on all of them.
+# create() builds the backend named by the configuration.
+
+import io
+import os
+import abc
+import hashlib
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import s3_cache
+import s3_parquet
+import s3_versions
+import tracing
+
+BACKENDS = ("s3", "local", "memory")
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _read_source(source):
+    return pd.read_parquet(source, memory_map=True)
+
+
+class Storage(abc.ABC):
+    """
+    Interface of a table storage backend. Subclasses implement the abstract head, open,
+    put, list, delete and source; fetch, read_parquet, read_schema and wait_for_version
+    build on them.
+    """
+
+    name = None  # Prefix of the backend's tracing spans
+
+    def __init__(self):
+        self._decoded = {}  # {key: (etag, DataFrame)}
+        self._decoded_lock = threading.Lock()
+
+    # --- Implemented by every backend ---
+
+    @abc.abstractmethod
+    def head(self, key):
+        """
+        Returns the version dict of the object at `key`, or None if it does not exist.
+        """
+
+    @abc.abstractmethod
+    def open(self, key):
+        """
+        Returns a seekable binary file over the object at `key`, with its `etag` attribute
+        set. Files may also count `bytes_read` and `requests`.
+        """
+
+    @abc.abstractmethod
+    def put(self, key, body, df=None):
+        """
+        Writes `body` (parquet bytes) to `key` and returns its version dict. `df`, the
+        decoded table, is kept so the next fetch of this version does not decode again.
+        """
+
+    @abc.abstractmethod
+    def list(self, prefix):
+        """
+        Returns the sorted keys starting with `prefix`.
+        """
+
+    @abc.abstractmethod
+    def delete(self, keys):
+        """
+        Deletes the objects at `keys`; keys that do not exist are ignored.
+        """
+
+    @abc.abstractmethod
+    def source(self, key):
+        """
+        Returns something pd.read_parquet and pq.read_table accept for the whole object
+        (a local path or an arrow buffer), or None if it is not available locally.
+        """
+
+    def uri(self, key):
+        return f"{self.name}://{key}"
+
+    # --- Shared ---
+
+    def _remember(self, key, etag, df):
+        with self._decoded_lock:
+            if df is None:
+                self._decoded.pop(key, None)
+            else:
+                self._decoded[key] = (etag, df)
+
+    def fetch(self, key, reader=None):
+        """
+        Returns (DataFrame, version) for the whole table at `key`. The decoded table is
+        reused while the object keeps its ETag. `reader(source)` decodes the object
+        (default: pd.read_parquet, memory-mapped where the backend allows it).
+        """
+        meta = self.head(key)
+        if meta is None:
+            raise FileNotFoundError(self.uri(key))
+
+        with self._decoded_lock:
+            cached = self._decoded.get(key)
+        if cached and cached[0] == meta["etag"]:
+            return cached[1], meta
+
+        with tracing.span("parquet.read", key=key) as attrs:
+            df = (reader or _read_source)(self.source(key))
+            attrs["rows"] = len(df)
+        self._remember(key, meta["etag"], df)
+        return df, meta
+
+    def read_parquet(self, key, columns=None, filters=None, compact=False, categorical=False):
+        """
+        Reads only the requested `columns` of the rows matching `filters` from the
+        parquet object at `key` (see s3_parquet.read_file).
+        """
+        with tracing.span(f"{self.name}.read_parquet", key=key) as attrs:
+            with self.open(key) as f:
+                df = s3_parquet.read_file(f, columns=columns, filters=filters, compact=compact, categorical=categorical)
+            attrs.update(bytes=getattr(f, "bytes_read", None), requests=getattr(f, "requests", None), rows=len(df))
+            return df
+
+    def read_schema(self, key):
+        """
+        Returns the arrow schema of the parquet object at `key`, read from its footer.
+        """
+        with self.open(key) as f:
+            return pq.ParquetFile(f).schema_arrow
+
+    def wait_for_version(self, key, **kwargs):
+        """
+        Polls until the object at `key` has been rewritten (see s3_versions.poll_version).
+        """
+        return s3_versions.poll_version(lambda: self.head(key), **kwargs)
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+class S3Storage(Storage):
+    """
+    Tables in an S3 bucket. Whole-table reads go through s3_cache (conditional GETs and
+    an on-disk copy); column/row reads fetch only the needed byte ranges.
+    """
+
+    name = "s3"
+
+    def __init__(self, client, bucket):
+        """
+        `client` is a boto3 S3 client, or a function returning one (see aws_clients.lazy)
+        that is called when the backend first talks to S3.
+        """
+        super().__init__()
+        self._client = client
+        self.bucket = bucket
+
+    @property
+    def client(self):
+        if callable(self._client):
+            self._client = self._client()
+        return self._client
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    def head(self, key):
+        return s3_versions.head_version(self.client, self.bucket, key)
+
+    def open(self, key):
+        return s3_parquet.S3RangeFile(self.client, self.bucket, key)
+
+    def fetch(self, key, reader=None):
+        return s3_cache.fetch(self.client, self.bucket, key, reader)
+
+    def put(self, key, body, df=None):
+        with tracing.span("s3.put_object", key=key, bytes=len(body)):
+            response = self.client.put_object(
+                Bucket=self.bucket, Key=key, Body=body, ContentType="application/octet-stream"
+            )
+        meta = {
+            "etag": response.get("ETag"),
+            "version_id": response.get("VersionId"),
+            "last_modified": None,
+        }
+        # Seed the cache, so the next conditional GET of this version is a 304
+        s3_cache.store(self.bucket, key, body, meta, df)
+        return meta
+
+    def list(self, prefix):
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return sorted(keys)
+
+    def delete(self, keys):
+        keys = list(keys)
+        for i in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in keys[i:i + 1000]]}
+            )
+
+    def source(self, key):
+        return s3_cache.cached_path(self.bucket, key)
+
+
+class LocalStorage(Storage):
+    """
+    Tables as files under `root` (key "a/b.parquet" -> root/a/b.parquet), e.g. a local
+    mirror of the bucket kept current by `aws s3 sync`. Reads are memory-mapped, and the
+    version of a file is derived from its size and modification time.
+    """
+
+    name = "local"
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def uri(self, key):
+        return self._path(key)
+
+    def head(self, key):
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return {
+            "etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            "version_id": None,
+            "last_modified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        }
+
+    def open(self, key):
+        meta = self.head(key)
+        if meta is None:
+            raise FileNotFoundError(self.uri(key))
+        f = open(self._path(key), "rb")
+        f.etag = meta["etag"]
+        return f
+
+    def put(self, key, body, df=None):
+        path = self._path(key)
+        with tracing.span("local.put", key=key, bytes=len(body)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)  # Readers never see a half-written file
+        meta = self.head(key)
+        self._remember(key, meta["etag"], df)
+        return meta
+
+    def list(self, prefix):
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            for file_name in files:
+                key = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if key.startswith(prefix) and not key.endswith(".tmp"):
+                    keys.append(key)
+        return sorted(keys)
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._remember(key, None, None)
+
+    def source(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+
+class MemoryStorage(Storage):
+    """
+    Tables held as parquet bytes in this process. Reads decode straight from the stored
+    buffer without copying it.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self.objects = {}  # {key: (body, version)}
+        self._lock = threading.Lock()
+
+    def head(self, key):
+        with self._lock:
+            stored = self.objects.get(key)
+        return dict(stored[1]) if stored else None
+
+    def open(self, key):
+        with self._lock:
+            stored = self.objects.get(key)
+        if stored is None:
+            raise FileNotFoundError(self.uri(key))
+        f = io.BytesIO(stored[0])
+        f.etag = stored[1]["etag"]
+        return f
+
+    def put(self, key, body, df=None):
+        meta = {
+            "etag": '"%s"' % hashlib.md5(body).hexdigest(),
+            "version_id": None,
+            "last_modified": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self.objects[key] = (bytes(body), meta)
+        self._remember(key, meta["etag"], df)
+        return dict(meta)
+
+    def list(self, prefix):
+        with self._lock:
+            return sorted(key for key in self.objects if key.startswith(prefix))
+
+    def delete(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self.objects.pop(key, None)
+        for key in keys:
+            self._remember(key, None, None)
+
+    def source(self, key):
+        with self._lock:
+            stored = self.objects.get(key)
+        return pa.BufferReader(stored[0]) if stored else None
+
+
+def create(backend, client=None, bucket=None, root=None):
+    """
+    Returns the storage backend named `backend` ('s3', 'local' or 'memory'): S3 needs
+    `client` (or a function creating it) and `bucket`, local needs `root`.
+    """
+    if backend == "s3":
+        return S3Storage(client, bucket)
+    if backend == "local":
+        if not root:
+            raise ValueError("The local storage backend needs a root directory")
+        return LocalStorage(root)
+    if backend == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of {', '.join(BACKENDS)}")
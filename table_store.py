@@ -0,0 +1,339 @@
+# table_store.py
+
+import time
+import functools
+import threading
+from datetime import datetime, timezone
+from dataclasses import dataclass
+import pandas as pd
+
+
+@dataclass
+class Snapshot:
+    """
+    One immutable version of a stored table shared by every session in the process.
+    """
+    df: pd.DataFrame
+    etag: str = None
+    version_id: str = None
+    checked_at: float = 0.0
+    local_revision: int = 0
+    updated_at: datetime = None
+
+
+@dataclass(eq=False)
+class PendingUpdate:
+    """
+    A local update (see TableStore.update) that no stored version contains yet.
+    """
+    func: object
+    expires: float
+
+
+class TableStore:
+    """
+    Process-wide, read-only snapshot store for the dashboard's tables, read from a
+    storage backend (see storage.py).
+
+    Every session reads the same DataFrame object for a key until the storage reports a
+    new ETag. Snapshots are revalidated (e.g. a conditional GET on S3) once they are older
+    than `ttl` seconds, or immediately after `invalidate`. Callers must treat the
+    returned frames as read-only and `.copy()` before modifying them.
+    """
+
+    def __init__(self, storage, ttl=60, reader=None):
+        self.storage = storage
+        self.ttl = ttl
+        self.reader = reader  # reader(key, source) -> DataFrame, e.g. a compact decoder
+        self._snapshots = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._reconciling = set()
+        self._pending = {}  # {key: [PendingUpdate]}, re-applied to every new version
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _is_fresh(self, snapshot):
+        return snapshot is not None and time.monotonic() - snapshot.checked_at < self.ttl
+
+    def get(self, key):
+        """
+        Returns the current snapshot DataFrame for `key`, loading or revalidating it if needed.
+        """
+        snapshot = self._snapshots.get(key)
+        if self._is_fresh(snapshot):
+            return snapshot.df
+
+        # Only one session per key talks to the storage; the others wait and reuse its result
+        with self._lock_for(key):
+            snapshot = self._snapshots.get(key)
+            if self._is_fresh(snapshot):
+                return snapshot.df
+
+            reader = functools.partial(self.reader, key) if self.reader else None
+            df, meta = self.storage.fetch(key, reader)
+
+            if snapshot is not None and snapshot.etag == meta.get("etag"):
+                snapshot.checked_at = time.monotonic()
+                return snapshot.df
+
+            snapshot = Snapshot(
+                df=df,
+                etag=meta.get("etag"),
+                version_id=meta.get("version_id"),
+                checked_at=time.monotonic(),
+            )
+            self._snapshots[key] = self._reapply(key, snapshot)
+            return snapshot.df
+
+    def peek(self, key, fresh=True):
+        """
+        Returns the snapshot DataFrame for `key` if one is held (and still fresh, unless
+        `fresh` is False), else None. Never touches the storage.
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is None or (fresh and not self._is_fresh(snapshot)):
+            return None
+        return snapshot.df
+
+    def version(self, key):
+        """
+        Returns the version of the snapshot currently held for `key` (its ETag, suffixed with
+        the local revision once `replace` or `update` has been used), or None.
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        if snapshot.local_revision:
+            return f"{snapshot.etag}+{snapshot.local_revision}"
+        return snapshot.etag
+
+    def replace(self, key, df, etag=None, version_id=None):
+        """
+        Swaps in a locally updated DataFrame for `key` without downloading it.
+
+        With `etag` (the object was just written by this process) the snapshot becomes that
+        stored version. Without it (e.g. after a delete the backend has confirmed) the
+        snapshot keeps its ETag plus a local revision, so it is replaced by the stored copy
+        as soon as the backend writes a new version (see reconcile).
+        """
+        with self._lock_for(key):
+            snapshot = self._snapshots.get(key)
+            if etag is not None:
+                self._snapshots[key] = Snapshot(
+                    df=df, etag=etag, version_id=version_id, checked_at=time.monotonic()
+                )
+            elif snapshot is None:
+                self._snapshots[key] = Snapshot(
+                    df=df, checked_at=time.monotonic(), local_revision=1, updated_at=datetime.now(timezone.utc)
+                )
+            else:
+                snapshot.df = df
+                snapshot.local_revision += 1
+                snapshot.updated_at = datetime.now(timezone.utc)
+
+    def _reapply(self, key, snapshot):
+        """
+        Re-applies the pending local updates of `key` to a newly downloaded snapshot, and
+        drops those the new version already contains and those that have expired.
+        """
+        now = time.monotonic()
+        pending = []
+        for update in self._pending.get(key, []):
+            if update.expires < now:
+                continue
+            df = update.func(snapshot.df)
+            if df is snapshot.df:
+                continue  # The stored version already has it
+            snapshot.df = df
+            snapshot.local_revision += 1
+            snapshot.updated_at = datetime.now(timezone.utc)
+            pending.append(update)
+        self._pending[key] = pending
+        return snapshot
+
+    def _is_pending(self, key, update=None):
+        now = time.monotonic()
+        pending = [u for u in self._pending.get(key, []) if u.expires >= now]
+        return update in pending if update is not None else bool(pending)
+
+    def update(self, key, func, hold=30):
+        """
+        Applies `func(df) -> df` to the snapshot held for `key` under the key's lock, so
+        concurrent local updates (e.g. two sessions adding COIs) build on each other.
+
+        `func` must be idempotent and return its input unchanged when there is nothing to do:
+        for `hold` seconds it is re-applied to every newly downloaded version, until one
+        already contains the update. A local update therefore survives versions written
+        before the backend got to it.
+
+        Returns (DataFrame, version, pending), where `pending` identifies the update for
+        reconcile (None if `func` changed nothing).
+        """
+        if key not in self._snapshots:
+            self.get(key)
+        with self._lock_for(key):
+            snapshot = self._snapshots[key]
+            df = func(snapshot.df)
+            if df is snapshot.df:
+                return df, self.version(key), None
+            snapshot.df = df
+            snapshot.local_revision += 1
+            snapshot.updated_at = datetime.now(timezone.utc)
+            pending = PendingUpdate(func, time.monotonic() + hold)
+            self._pending.setdefault(key, []).append(pending)
+            return df, self.version(key), pending
+
+    def reconcile(self, key, timeout=30, update=None):
+        """
+        Waits until the storage holds a version that contains the local `update` (as returned
+        by `update`; default: every pending update of `key`), downloading each new version
+        (new ETag, or rewritten after the local update) as it appears.
+        Returns True once reconciled, False on timeout (pending updates then stay applied
+        to the snapshot until they expire).
+        """
+        deadline = time.monotonic() + timeout
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return True
+        previous_etag, modified_after = snapshot.etag, snapshot.updated_at
+
+        while self._is_pending(key, update):
+            version = self.storage.wait_for_version(
+                key, previous_etag=previous_etag, modified_after=modified_after,
+                timeout=max(0.0, deadline - time.monotonic())
+            )
+            if version is None:
+                return False
+            previous_etag, modified_after = version["etag"], version.get("last_modified") or modified_after
+            self.invalidate(key)
+            self.get(key)
+        return True
+
+    def reconcile_in_background(self, key, timeout=30):
+        """
+        Runs reconcile(key) on a daemon thread; at most one reconcile per key at a time.
+        """
+        with self._locks_guard:
+            if key in self._reconciling:
+                return
+            self._reconciling.add(key)
+
+        def run():
+            try:
+                self.reconcile(key, timeout=timeout)
+            except Exception:
+                self.invalidate(key)  # Fall back to a normal revalidation on the next read
+            finally:
+                with self._locks_guard:
+                    self._reconciling.discard(key)
+
+        threading.Thread(target=run, name=f"reconcile:{key}", daemon=True).start()
+
+    def __contains__(self, key):
+        return key in self._snapshots
+
+    def sync(self, key, etag):
+        """
+        Brings the snapshot for `key` in line with the ETag the storage currently reports
+        (e.g. from a HEAD request): a matching snapshot is marked fresh, an outdated one is replaced.
+        Returns True if a new version was downloaded.
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return False
+        if snapshot.etag == etag:
+            snapshot.checked_at = time.monotonic()
+            return False
+        self.invalidate(key)
+        self.get(key)
+        return True
+
+    def invalidate(self, *keys):
+        """
+        Forces a version check on the next read of the given keys (all keys if none given).
+        Unchanged objects keep their snapshot; only a new ETag triggers a download.
+        """
+        for key in keys or list(self._snapshots):
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                snapshot.checked_at = float("-inf")
+
+
+class TableWatcher:
+    """
+    Per-process daemon thread that HEADs the watched keys every `interval` seconds.
+
+    Unchanged keys only have their snapshots marked fresh, so sessions never wait on a
+    revalidation; a key whose ETag changed is downloaded into the store (if the store holds
+    it) and reported to `on_change(key)`. Keys in `load` that the store does not hold yet
+    (e.g. a first load failed) are loaded as soon as they exist; other keys the store does
+    not hold, such as the large transactions table, are only reported.
+    """
+
+    def __init__(self, store, keys, interval=15, on_change=None, load=()):
+        self.store = store
+        self.keys = tuple(keys)
+        self.load = frozenset(load)
+        self.interval = interval
+        self.on_change = on_change
+        self.checked_at = None
+        self.errors = 0
+
+        self._etags = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="table-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """
+        Runs one pass over the watched keys and returns the keys that changed. A key that
+        fails (e.g. a network blip, or an object that was deleted) is skipped for this pass
+        and the others are still checked; `errors` counts consecutive passes with a failure.
+        """
+        changed, failed = [], 0
+        for key in self.keys:
+            try:
+                version = self.store.storage.head(key)
+                etag = version["etag"] if version else None
+
+                previous = self._etags.get(key)
+                if key in self.store:
+                    if self.store.sync(key, etag):
+                        changed.append(key)
+                elif key in self.load and etag is not None:
+                    self.store.get(key)
+                    changed.append(key)
+                elif previous is not None and etag != previous:
+                    changed.append(key)
+                self._etags[key] = etag
+            except Exception:
+                failed += 1  # Sessions reading this key fall back to the TTL
+
+        for key in changed:
+            if self.on_change is not None:
+                try:
+                    self.on_change(key)
+                except Exception:
+                    failed += 1
+        self.errors = self.errors + 1 if failed else 0
+        self.checked_at = time.time()
+        return changed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception:
+                self.errors += 1
+            self._stop.wait(self.interval)
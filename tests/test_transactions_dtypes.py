@@ -0,0 +1,61 @@
+# tests/test_transactions_dtypes.py
+#
+# The dtypes the admin app decodes the transactions table to, on every read path.
+
+import pandas as pd
+import pytest
+import storage
+import transactions_store
+import admin_functions as af
+from benchmarks import data
+
+TRANSACTIONS_KEY = "transactions.parquet"
+PREFIX = "transactions"
+
+
+@pytest.fixture
+def transactions():
+    return data.transactions_table(data.coi_table(5000), 2000)
+
+
+@pytest.fixture
+def memory_storage(monkeypatch):
+    memory = storage.MemoryStorage()
+    monkeypatch.setattr(af, "STORAGE", memory)
+    monkeypatch.setattr(af, "TRANSACTIONS_TABLE_NAME", TRANSACTIONS_KEY)
+    monkeypatch.setattr(af, "COMPACT_DTYPES", True)
+    af.get_table_store.clear()
+    yield memory
+    af.get_table_store.clear()
+
+
+def _assert_compact(df):
+    assert isinstance(df["transaction_type"].dtype, pd.CategoricalDtype)
+    assert df["num_tokens"].dtype == "int8"
+    assert str(df["coi_email"].dtype).startswith("string")
+
+
+def test_snapshot_is_compact(memory_storage, transactions):
+    memory_storage.put(TRANSACTIONS_KEY, transactions.to_parquet(index=False))
+    df = af.get_table_store().get(TRANSACTIONS_KEY)
+    _assert_compact(df)
+
+
+def test_ranged_read_is_compact(memory_storage, transactions):
+    memory_storage.put(TRANSACTIONS_KEY, transactions.to_parquet(index=False))
+    df = af.read_table(TRANSACTIONS_KEY, columns=["coi_email", "num_tokens", "transaction_type"])
+    _assert_compact(df)
+
+
+def test_partitioned_read_is_compact(memory_storage, monkeypatch, transactions):
+    monkeypatch.setattr(af, "TRANSACTIONS_PREFIX", PREFIX)
+    transactions_store.append(memory_storage, PREFIX, transactions)
+    df = af.read_transactions(columns=["coi_email", "num_tokens", "transaction_type"])
+    assert len(df) == len(transactions)
+    _assert_compact(df)
+
+
+def test_edited_tables_get_no_categories(memory_storage):
+    memory_storage.put("coi.parquet", data.coi_table(50).to_parquet(index=False))
+    df = af.read_table("coi.parquet")
+    assert not any(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes)
@@ -0,0 +1,63 @@
+# tests/test_transactions_store.py
+#
+# Reading the partitioned transactions layout while it is being compacted.
+
+import threading
+import pandas as pd
+import pytest
+import storage
+import transactions_store
+from benchmarks import data
+
+PREFIX = "transactions"
+
+
+@pytest.fixture
+def memory_storage():
+    return storage.MemoryStorage()
+
+
+@pytest.fixture
+def transactions():
+    return data.transactions_table(data.coi_table(100), 600)
+
+
+def _append_in_batches(memory_storage, transactions, batches=3):
+    for rows in (transactions.iloc[i::batches] for i in range(batches)):
+        transactions_store.append(memory_storage, PREFIX, rows)
+
+
+def _sorted(df):
+    return df.sort_values(["timestamp", "coi_id", "num_tokens"]).reset_index(drop=True)
+
+
+def test_read_during_compact_rereads_the_compacted_file(memory_storage, monkeypatch, transactions):
+    _append_in_batches(memory_storage, transactions)
+    read_parquet = memory_storage.read_parquet
+    compacted = []
+    lock = threading.Lock()  # Files are read from a thread pool
+
+    def compact_before_first_read(key, **kwargs):
+        # The files were listed; a compaction replaces them before any is read
+        with lock:
+            if not compacted:
+                monkeypatch.setattr(memory_storage, "read_parquet", read_parquet)
+                compacted.append(transactions_store.compact(memory_storage, PREFIX))
+        return read_parquet(key, **kwargs)
+
+    monkeypatch.setattr(memory_storage, "read_parquet", compact_before_first_read)
+    df = transactions_store.read(memory_storage, PREFIX)
+
+    assert compacted[0] > 0
+    pd.testing.assert_frame_equal(_sorted(df), _sorted(transactions), check_dtype=False)
+
+
+def test_read_fails_when_files_keep_vanishing(memory_storage, monkeypatch, transactions):
+    _append_in_batches(memory_storage, transactions)
+
+    def vanished(key, **kwargs):
+        raise FileNotFoundError(memory_storage.uri(key))
+
+    monkeypatch.setattr(memory_storage, "read_parquet", vanished)
+    with pytest.raises(FileNotFoundError):
+        transactions_store.read(memory_storage, PREFIX)
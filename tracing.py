@@ -0,0 +1,172 @@
+# tracing.py
+#
+# Lightweight spans around the hot paths (S3 transfers, parquet decode/encode, Cognito
+# refreshes, API Gateway calls). Each finished span:
+#
+#   - is appended to the current rerun's Trace, when the calling context has one
+#   - adds to process-wide counters (count, errors, total ms, bytes, rows) per span name
+#   - is logged as one JSON line on the "eureka.trace" logger, when that logger is enabled
+#
+# A span costs two clock reads, a dict and a short lock, so tracing stays on in production.
+
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger("eureka.trace")
+
+# The Trace of the rerun running in this context (see start_rerun)
+_CURRENT = contextvars.ContextVar("eureka_trace", default=None)
+
+# Process-wide totals per span name
+_COUNTERS = {}
+_COUNTERS_LOCK = threading.Lock()
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+class Trace:
+    """
+    The spans recorded during one script (or fragment) rerun.
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.started = time.time()
+        self.spans = []
+        self.duration_ms = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    @property
+    def elapsed_ms(self):
+        """
+        The rerun's duration once finished, else the time since it started.
+        """
+        if self.duration_ms is not None:
+            return self.duration_ms
+        return (time.perf_counter() - self._start) * 1000
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def summary(self):
+        """
+        Returns one dict per span name: count, total ms, bytes and rows.
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            total = totals.setdefault(record["span"], {"span": record["span"], "count": 0, "ms": 0.0, "bytes": 0, "rows": 0})
+            total["count"] += 1
+            total["ms"] += record["ms"]
+            total["bytes"] += record.get("bytes") or 0
+            total["rows"] += record.get("rows") or 0
+        return list(totals.values())
+
+
+def _count(record):
+    with _COUNTERS_LOCK:
+        counter = _COUNTERS.setdefault(
+            record["span"], {"count": 0, "errors": 0, "ms": 0.0, "bytes": 0, "rows": 0}
+        )
+        counter["count"] += 1
+        counter["errors"] += "error" in record
+        counter["ms"] += record["ms"]
+        counter["bytes"] += record.get("bytes") or 0
+        counter["rows"] += record.get("rows") or 0
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times the enclosed block as span `name`. Yields the span's attribute dict, which the
+    block fills in with what it learns (e.g. attrs["bytes"], attrs["rows"]); an
+    exception is recorded as attrs["error"] and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        record(name, (time.perf_counter() - start) * 1000, **attrs)
+
+
+def record(name, ms, **attrs):
+    """
+    Records a span `name` that took `ms` milliseconds, for work timed elsewhere.
+    """
+    entry = {"span": name, "ms": ms, **attrs}
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.add(entry)
+    _count(entry)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(entry, default=str))
+
+
+def start_rerun(label=None):
+    """
+    Starts a new Trace that collects the spans of this context (the script thread of a
+    rerun) and of the callables wrapped with bind(). Returns the Trace.
+    """
+    trace = Trace(label)
+    _CURRENT.set(trace)
+    return trace
+
+
+def current():
+    """
+    Returns the Trace of the running rerun, or None.
+    """
+    return _CURRENT.get()
+
+
+def bind(func):
+    """
+    Wraps `func` so its spans join the current rerun's Trace when it runs in a worker thread.
+    """
+    trace = _CURRENT.get()
+
+    def run(*args, **kwargs):
+        token = _CURRENT.set(trace)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _CURRENT.reset(token)
+
+    return run
+
+
+def counters():
+    """
+    Returns a snapshot of the process-wide counters: {span name: {count, errors, ms, bytes, rows}}.
+    """
+    with _COUNTERS_LOCK:
+        return {name: dict(counter) for name, counter in _COUNTERS.items()}
+
+
+def enable_logging(level=logging.INFO, stream=None):
+    """
+    Sends the span log lines to `stream` (default stderr), for scraping.
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
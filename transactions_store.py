@@ -0,0 +1,321 @@
+# transactions_store.py
+#
+# Partitioned, append-only layout for the transactions table:
+#
+#   <prefix>/month=2025-04/part-<seq>-<id>.parquet         small appended files
+#   <prefix>/month=2025-04/compacted-<seq>.parquet          merged by compact()
+#
+# Partitions can also be split by COI (month=2025-04/coi_id=abc/...). A compacted
+# file records the exact keys it merged in its parquet metadata and replaces those
+# files only, so readers never see a row twice while compaction is running, and a part
+# that lands after compaction listed the partition stays visible until the next one.
+# Run one compactor at a time.
+
+import json
+import time
+import uuid
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import s3_parquet
+import tracing
+
+PART_PREFIX = "part-"
+COMPACTED_PREFIX = "compacted-"
+
+# Partition files fetched in parallel by read()
+MAX_WORKERS = 8
+
+# Parquet metadata key listing the files a compacted file merged (JSON list of keys)
+MERGED_KEY = b"eureka.merged"
+
+# {compacted key: frozenset of merged keys, or None for files written before MERGED_KEY}.
+# Compacted files are never rewritten under the same key, so entries stay valid.
+_MERGED = {}
+_MERGED_LOCK = threading.Lock()
+
+# ==============================
+#  HELPER FUNCTIONS
+# ==============================
+
+def _partition_path(prefix, values):
+    return "/".join([prefix.rstrip("/")] + [f"{name}={value}" for name, value in values])
+
+
+def _parse_key(prefix, key):
+    """
+    Returns (partition_values, kind, seq) for a key written by this module, or None.
+    """
+    relative = key[len(prefix.rstrip("/")) + 1:]
+    *directories, file_name = relative.split("/")
+    values = tuple(tuple(d.split("=", 1)) for d in directories if "=" in d)
+
+    try:
+        if file_name.startswith(PART_PREFIX):
+            return values, "part", int(file_name[len(PART_PREFIX):].split("-")[0])
+        if file_name.startswith(COMPACTED_PREFIX):
+            return values, "compacted", int(file_name[len(COMPACTED_PREFIX):].split(".")[0].split("-")[0])
+    except ValueError:
+        pass
+    return None
+
+
+def _merged_keys(storage, key):
+    """
+    Returns the keys the compacted file `key` merged, read once from its footer.
+    """
+    with _MERGED_LOCK:
+        if key in _MERGED:
+            return _MERGED[key]
+
+    with storage.open(key) as f:
+        metadata = pq.ParquetFile(f).schema_arrow.metadata or {}
+    merged = metadata.get(MERGED_KEY)
+    merged = frozenset(json.loads(merged)) if merged is not None else None
+
+    with _MERGED_LOCK:
+        _MERGED[key] = merged
+    return merged
+
+
+def _list_entries(storage, prefix):
+    """
+    Returns {partition_values: [(kind, seq, key)]} for every file under `prefix` written by this module.
+    """
+    found = {}
+    for key in storage.list(prefix.rstrip("/") + "/"):
+        parsed = _parse_key(prefix, key)
+        if parsed is not None:
+            values, kind, seq = parsed
+            found.setdefault(values, []).append((kind, seq, key))
+    return found
+
+
+def _live(storage, entries):
+    """
+    Returns the keys of one partition's files that no compacted file has merged,
+    compacted files first.
+    """
+    merged, legacy = set(), {}
+    for kind, seq, key in entries:
+        if kind == "compacted":
+            keys = _merged_keys(storage, key)
+            if keys is None:
+                legacy[key] = seq
+            else:
+                merged |= keys
+    covered = max(legacy.values(), default=-1)
+
+    live = [
+        (kind, seq, key) for kind, seq, key in entries
+        if key not in merged
+        and not (kind == "part" and seq <= covered)
+        and not (key in legacy and seq < covered)
+    ]
+    return [key for kind, seq, key in sorted(live, key=lambda e: (e[0] != "compacted", e[1]))]
+
+
+def _partition_values(df, partition_by, date_column):
+    """
+    Returns a DataFrame with one string column per partition level for every row of `df`.
+    Rows without a usable date land in the current month.
+    """
+    values = pd.DataFrame(index=df.index)
+    for name in partition_by:
+        if name == "month":
+            if date_column in df.columns:
+                months = pd.to_datetime(df[date_column], errors="coerce").dt.strftime("%Y-%m")
+            else:
+                months = pd.Series(None, index=df.index, dtype=object)
+            values[name] = months.fillna(time.strftime("%Y-%m", time.gmtime()))
+        else:
+            values[name] = df[name].astype(str)
+    return values
+
+
+def _as_timestamp(value, like):
+    """
+    Converts a filter bound to a Timestamp comparable with `like` (tz-aware or naive).
+    """
+    value = pd.Timestamp(value)
+    if like.tzinfo is None and value.tzinfo is not None:
+        return value.tz_convert(None)
+    if like.tzinfo is not None and value.tzinfo is None:
+        return value.tz_localize(like.tzinfo)
+    return value
+
+
+def _partition_may_match(values, filters, date_column):
+    """
+    Uses the partition's month/coi_id values to decide whether any row can pass `filters`.
+    """
+    values = dict(values)
+    groups = [filters] if s3_parquet.is_flat_filters(filters) else (filters or [[]])
+
+    for group in groups:
+        matches = True
+        for column, op, value in group:
+            if column == "coi_id" and "coi_id" in values:
+                if op in ("==", "=") and str(value) != values["coi_id"]:
+                    matches = False
+                if op == "in" and values["coi_id"] not in {str(v) for v in value}:
+                    matches = False
+
+            if column == date_column and "month" in values:
+                month_start = pd.Timestamp(values["month"] + "-01")
+                bound = _as_timestamp(value, month_start)
+                month_start = _as_timestamp(month_start, bound)
+                month_end = month_start + pd.offsets.MonthBegin(1)
+                if op in (">", ">=") and bound >= month_end:
+                    matches = False
+                if op in ("<", "<=") and bound < month_start:
+                    matches = False
+                if op == "<" and bound == month_start:
+                    matches = False
+
+        if matches:
+            return True
+    return False
+
+
+# ==============================
+#  MAIN FUNCTIONS
+# ==============================
+
+def list_files(storage, prefix):
+    """
+    Returns {partition_values: [keys]} for every live file under `prefix` in `storage`:
+    the files no compacted file has merged, compacted files first. (A compacted file
+    written before merged keys were recorded covers the parts up to its sequence number.)
+    """
+    return {values: _live(storage, entries) for values, entries in _list_entries(storage, prefix).items()}
+
+
+def read_schema(storage, prefix):
+    """
+    Returns the arrow schema of the transactions table, read from one partition file's footer.
+    """
+    for keys in list_files(storage, prefix).values():
+        if keys:
+            return storage.read_schema(keys[-1])
+    raise FileNotFoundError(f"No transaction partitions under {storage.uri(prefix)}")
+
+
+def read(storage, prefix, columns=None, filters=None, date_column="timestamp", compact=False, categorical=False):
+    """
+    Reads the transactions matching `filters`, touching only the partitions that can match.
+    Within each file the filters and column projection are pushed into the parquet scan.
+
+    A compaction running at the same time deletes the files it merged. If one vanishes
+    before it is read, the partitions are listed again (picking up the compacted file)
+    and only the files not read yet are read; FileNotFoundError if it happens twice.
+    """
+    @tracing.bind
+    def read_one(key):
+        try:
+            return storage.read_parquet(key, columns=columns, filters=filters, compact=compact, categorical=categorical)
+        except FileNotFoundError:
+            return None
+
+    frames = {}  # {key: DataFrame} of the files read so far
+    for _ in range(2):
+        files = list_files(storage, prefix)
+        keys = [
+            key
+            for values, partition_keys in sorted(files.items())
+            if _partition_may_match(values, filters, date_column)
+            for key in partition_keys
+        ]
+        if not keys:
+            return pd.DataFrame(columns=columns)
+
+        to_read = [key for key in keys if key not in frames]
+        if to_read:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(to_read))) as pool:
+                for key, frame in zip(to_read, pool.map(read_one, to_read)):
+                    if frame is not None:
+                        frames[key] = frame
+        if all(key in frames for key in keys):
+            return pd.concat([frames[key] for key in keys], ignore_index=True)
+
+    vanished = [key for key in keys if key not in frames]
+    raise FileNotFoundError(f"Transaction files deleted while reading: {', '.join(map(storage.uri, vanished))}")
+
+
+def append(storage, prefix, df, partition_by=("month",), date_column="timestamp"):
+    """
+    Writes new transactions as one small part file per partition and returns the keys written.
+    Cost is proportional to the new rows only; existing files are never rewritten.
+    """
+    if df.empty:
+        return []
+
+    keys = []
+    values = _partition_values(df, partition_by, date_column)
+    for group_values, rows in df.groupby([values[name] for name in partition_by], sort=False):
+        if not isinstance(group_values, tuple):
+            group_values = (group_values,)
+
+        path = _partition_path(prefix, zip(partition_by, group_values))
+        key = f"{path}/{PART_PREFIX}{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+
+        with tracing.span("parquet.write", key=key, rows=len(rows)) as attrs:
+            buffer = BytesIO()
+            rows.to_parquet(buffer, index=False)
+            attrs["bytes"] = buffer.tell()
+        storage.put(key, buffer.getvalue())
+        keys.append(key)
+    return keys
+
+
+def compact(storage, prefix, min_files=2):
+    """
+    Merges every partition with at least `min_files` live files into a single compacted file
+    and deletes the files it replaced. Returns the number of partitions compacted.
+    """
+    compacted = 0
+    for values, entries in _list_entries(storage, prefix).items():
+        keys = _live(storage, entries)
+        if len(keys) < min_files:
+            continue
+        # Files the live ones already replaced are merged (and deleted) along with them
+        replaced = sorted(key for _, _, key in entries)
+
+        frames = [storage.read_parquet(key) for key in keys]
+
+        # The compacted file hides exactly the files it merged
+        path = _partition_path(prefix, values)
+        new_key = f"{path}/{COMPACTED_PREFIX}{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+
+        with tracing.span("parquet.write", key=new_key, rows=sum(len(frame) for frame in frames)) as attrs:
+            table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+            metadata = {**(table.schema.metadata or {}), MERGED_KEY: json.dumps(replaced).encode()}
+            buffer = BytesIO()
+            pq.write_table(table.replace_schema_metadata(metadata), buffer)
+            attrs["bytes"] = buffer.tell()
+        storage.put(new_key, buffer.getvalue())
+        with _MERGED_LOCK:
+            _MERGED[new_key] = frozenset(replaced)
+
+        storage.delete(replaced)
+        compacted += 1
+    return compacted
+
+
+if __name__ == "__main__":
+    # Periodic compaction, e.g. from cron. Uses the dashboard's settings (storage backend,
+    # bucket, EUREKA_S3_TRANSACTIONS_PREFIX), so it compacts what the dashboard reads.
+    import argparse
+    import admin_functions
+
+    parser = argparse.ArgumentParser(description="Compact the partitioned transactions table.")
+    parser.add_argument("--min-files", type=int, default=2)
+    args = parser.parse_args()
+
+    if not admin_functions.TRANSACTIONS_PREFIX:
+        parser.error("The transactions table is not partitioned (no s3.TRANSACTIONS_PREFIX setting)")
+    n = admin_functions.compact_transactions(min_files=args.min_files)
+    print(f"Compacted {n} partition(s) of {admin_functions.STORAGE.uri(admin_functions.TRANSACTIONS_PREFIX)}")